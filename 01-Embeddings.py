@@ -51,6 +51,7 @@ print(x_tr_flat.shape, x_te_flat.shape)
 # Neural Network Parameters
 batch_size, n_epoch = 100, 50
 n_hidden, z_dim = 256, 2
+inference_batch_size = 4096  # inference has no gradients to hold, so much larger batches fit
 
 
 # In[ ]:
@@ -64,9 +65,10 @@ plt.imshow(x_tr[1]);
 
 
 # sampling function
+# eps takes its shape from mu at run time, so the encoder works with any batch size
 def sampling(args):
     mu, log_var = args
-    eps = K.random_normal(shape=(batch_size, z_dim), mean=0., stddev=1.0)
+    eps = K.random_normal(shape=K.shape(mu), mean=0., stddev=1.0)
     return mu + K.exp(log_var) * eps
 
 
@@ -119,15 +121,23 @@ vae_flat.compile(optimizer='adam')
 # In[ ]:
 
 
-# train
-vae_flat.fit(
-    x_tr_flat,
-    shuffle=True,
-    epochs=n_epoch,
-    batch_size=batch_size,
-    validation_data=(x_te_flat, None),
-    verbose=1
-)
+# train - or reload the weights saved by a previous run instead of training again
+import os
+
+weights_path = "vae_mnist.weights.h5"
+
+if os.path.exists(weights_path):
+    vae_flat.load_weights(weights_path)
+else:
+    vae_flat.fit(
+        x_tr_flat,
+        shuffle=True,
+        epochs=n_epoch,
+        batch_size=batch_size,
+        validation_data=(x_te_flat, None),
+        verbose=1
+    )
+    vae_flat.save_weights(weights_path)
 
 
 # ### Visualize Embeddings
@@ -136,14 +146,49 @@ vae_flat.fit(
 
 
 # Build encoders
-encoder_f = Model(inputs_flat, z_flat)  # flat encoder
+encoder_f = Model(inputs_flat, z_flat)  # flat encoder, samples z (non-deterministic)
+encoder_mu = Model(inputs_flat, mu_flat)  # deterministic encoder, returns the mean of z
+
+
+# In[ ]:
+
+
+# Encode the test set with the deterministic encoder, chunk by chunk, into an on-disk array.
+# The latents are reused on the next run unless the weights have changed since.
+from vector_store import VectorStore, open_store
+
+latents_path = "mnist_test_latents.vecs"
+
+def encode_latents(x, path, chunk_size=10_000):
+    store = VectorStore.create(path, z_dim)
+    for start in range(0, len(x), chunk_size):
+        store.append(encoder_mu.predict(x[start:start+chunk_size], batch_size=inference_batch_size, verbose=0))
+    return store
+
+if not os.path.exists(latents_path) or os.path.getmtime(latents_path) < os.path.getmtime(weights_path):
+    encode_latents(x_te_flat, latents_path)
+
+
+# In[ ]:
+
+
+# Inference throughput at different batch sizes (best of 3 runs over the test set)
+import time
+
+for bs in [100, 500, 2_000, 4_096, 10_000]:
+    runs = []
+    for _ in range(3):
+        t0 = time.time()
+        encoder_f.predict(x_te_flat, batch_size=bs, verbose=0)
+        runs.append(time.time()-t0)
+    print(f"batch_size={bs}: {len(x_te_flat)/min(runs): ,.0f} embeddings/s")
 
 
 # In[ ]:
 
 
 # Plot of the digit classes in the latent space
-x_te_latent = encoder_f.predict(x_te_flat, batch_size=batch_size,verbose=0)
+x_te_latent = np.array(open_store(latents_path).vectors)  # a copy, so re-caching cannot truncate it
 plt.figure(figsize=(8, 6))
 plt.scatter(x_te_latent[:, 0], x_te_latent[:, 1], c=y_te, alpha=0.75)
 plt.title('MNIST 2D Embeddings')
@@ -216,6 +261,31 @@ print(embedding)
 # In[ ]:
 
 
+# Encoding the same sentences again is wasted work. The embedding cache stores every embedding
+# on disk under a hash of its text, so only sentences it has not seen before reach the model.
+from embedding_cache import EmbeddingCache
+
+with EmbeddingCache(model_name="paraphrase-MiniLM-L6-v2") as cache:
+    cached_embedding = cache.encode(sentence, model.encode)
+
+print(np.allclose(cached_embedding, embedding, atol=1e-6))
+
+
+# In[ ]:
+
+
+# For corpora too large to pass to model.encode() in one list, stream them instead:
+# texts are read a window at a time, grouped into batches of similar length (less padding)
+# and encoded on a thread pool, yielding (ids, embeddings) chunks as they are ready.
+from stream_encoder import stream_encode
+
+for ids, chunk in stream_encode(sentence, model.encode, batch_size=2):
+    print(ids, chunk.shape)
+
+
+# In[ ]:
+
+
 embedding.shape
 
 
@@ -356,8 +426,11 @@ zero_A/zero_B
 
 
 # Cosine Distance function
+# (the same formula, computed by the vectorized distance module)
+from distances import distance_matrix
+
 def cosine_distance(vec1,vec2):
-  cosine = 1 - (np.dot(vec1, vec2)/(np.linalg.norm(vec1)*np.linalg.norm(vec2)))
+  cosine = distance_matrix(vec1, vec2, metric="cosine", dtype=np.float64)[0, 0]
   return cosine
 
 
@@ -399,6 +472,49 @@ print("Distance 0-2: ", cosine_distance(embedding[0], embedding[2]))
 print("Distance 1-2: ", cosine_distance(embedding[1], embedding[2]))
 
 
+# ### All pairs at once
+# Scoring one pair at a time is fine for three sentences, but for many
+# embeddings we compute the whole query x corpus matrix in one go.
+# L2, dot product and cosine each run as a single matrix multiply per block.
+
+# In[ ]:
+
+
+print("L1:\n", distance_matrix(embedding, embedding, metric="l1"))
+print("L2:\n", distance_matrix(embedding, embedding, metric="l2"))
+print("Dot Product:\n", distance_matrix(embedding, embedding, metric="dot"))
+print("Cosine Distance:\n", distance_matrix(embedding, embedding, metric="cosine"))
+
+
+# ### Quantized embeddings
+# Storing the sentence embeddings as int8 takes 4x less memory than float32, at a small cost in accuracy.
+
+# In[ ]:
+
+
+from quantization import ScalarQuantizer
+
+sq = ScalarQuantizer("int8").train(embedding)
+embedding_int8 = sq.encode(embedding)
+
+print("Cosine Distance (float32):\n", distance_matrix(embedding, embedding, metric="cosine"))
+print("Cosine Distance (int8):\n", distance_matrix(sq.decode(embedding_int8), sq.decode(embedding_int8), metric="cosine"))
+
+
+# In[ ]:
+
+
+# Going further: 1 bit per dimension. The 384-dim embedding fits in 6 uint64 words (48 bytes),
+# and the Hamming distance between the bit codes roughly tracks the cosine distance.
+from quantization import binarize, hamming_distances
+
+embedding_bits = binarize(embedding)
+print("Binary code shape:", embedding_bits.shape, embedding_bits.dtype)
+print("Hamming distance 0-1:", hamming_distances(embedding_bits[0], embedding_bits[1:2])[0])
+print("Hamming distance 0-2:", hamming_distances(embedding_bits[0], embedding_bits[2:3])[0])
+print("Hamming distance 1-2:", hamming_distances(embedding_bits[1], embedding_bits[2:3])[0])
+
+
 # In[ ]:
 
 
@@ -10,6 +10,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.neighbors import NearestNeighbors
 import time
+from benchmark import bench, measure, summarize, sweep, format_result, write_json
 np.random.seed(42)
 
 
@@ -68,12 +69,11 @@ print(neighbours)
 # In[ ]:
 
 
-t0 = time.time()
-neighbours = neigh.kneighbors([[0.45,0.2]], k, return_distance=True)
-t1 = time.time()
+# A single `time.time()` delta is noisy: warm up first, repeat the query and look at the percentiles
+result = bench("kneighbors", lambda: neigh.kneighbors([[0.45,0.2]], k, return_distance=True), n=len(X))
 
-query_time = t1-t0
-print(f"Runtime: {query_time: .4f} seconds")
+query_time = result["stats"]["p50_ms"] / 1e3
+print(format_result(result))
 
 
 # In[ ]:
@@ -88,13 +88,11 @@ def speed_test(count):
     neigh = NearestNeighbors(n_neighbors=k, algorithm='brute', metric='euclidean')
     neigh.fit(data)
 
-    # measure time for a brute force query
-    t0 = time.time()
-    neighbours = neigh.kneighbors([[0.45,0.2]], k, return_distance=True)
-    t1 = time.time()
+    # measure time for a brute force query (median of a few runs after one warm-up)
+    stats = summarize(measure(lambda: neigh.kneighbors([[0.45,0.2]], k, return_distance=True), warmup=1, repeat=5))
 
-    total_time = t1-t0
-    print (f"Runtime: {total_time: .4f}")
+    total_time = stats["p50_ms"] / 1e3
+    print (f"Runtime: {total_time: .4f} (p95 {stats['p95_ms']/1e3: .4f})")
 
     return total_time
 
@@ -115,6 +113,41 @@ time20m = speed_test(20_000_000)
 time200m = speed_test(200_000_000)
 
 
+# ## Keeping the corpus on disk
+# `speed_test(200_000_000)` needs the whole corpus in RAM. Instead, write the points once to an
+# on-disk vector store (a small header followed by the raw float32 rows) and open it with `np.memmap`.
+# Search streams over the file in chunks, and reopening it later is near-instant.
+
+# In[ ]:
+
+
+import os
+from vector_store import VectorStore, open_store
+
+def speed_test_on_disk(count, chunk_size=10_000_000):
+    path = f"speed_test_{count}.vecs"
+
+    # generate random objects straight to disk, one chunk at a time
+    if not os.path.exists(path):
+        chunks = (np.random.rand(min(chunk_size, count - i), 2) for i in range(0, count, chunk_size))
+        VectorStore.from_array(path, chunks)
+
+    open_stats = summarize(measure(lambda: open_store(path), warmup=0, repeat=5))
+    store = open_store(path)
+    stats = summarize(measure(lambda: store.search([[0.45,0.2]], 4, metric="l2", chunk_size=chunk_size),
+                              warmup=1, repeat=3))
+
+    print (f"Open: {open_stats['p50_ms']/1e3: .4f}, Runtime: {stats['p50_ms']/1e3: .4f}")
+
+    return stats["p50_ms"] / 1e3
+
+
+# In[ ]:
+
+
+time200m = speed_test_on_disk(200_000_000)
+
+
 # ## Brute force kNN implemented by hand on `768` dimensional embeddings
 
 # In[ ]:
@@ -134,14 +167,16 @@ query = query / np.sqrt((query**2).sum()) # normalize query
 
 
 # kNN
-t0 = time.time()
-# Calculate Dot Product between the query and all data items
-similarities = embeddings.dot(query)
-# Sort results
-sorted_ix = np.argsort(-similarities)
-t1 = time.time()
-
-total = t1-t0
+def knn_query(embeddings, query):
+    # Calculate Dot Product between the query and all data items
+    similarities = embeddings.dot(query)
+    # Sort results
+    sorted_ix = np.argsort(-similarities)
+    return similarities, sorted_ix
+
+similarities, sorted_ix = knn_query(embeddings, query)
+
+total = summarize(measure(lambda: knn_query(embeddings, query)))["p50_ms"] / 1e3
 print(f"Runtime for dim={dimensions}, documents_n={documents}: {np.round(total,3)} seconds")
 
 print("Top 5 results:")
@@ -154,17 +189,17 @@ for k in sorted_ix[:5]:
 
 n_runs = [1_000, 10_000, 100_000, 500_000]
 
-for n in n_runs:
+def setup(n):
     embeddings = np.random.randn(n, dimensions) #768-dimensional embeddings
     query = np.random.randn(768) # the query vector
-    
-    t0 = time.time()
-    similarities = embeddings.dot(query)
-    sorted_ix = np.argsort(-similarities)
-    t1 = time.time()
+    return lambda: knn_query(embeddings, query)
 
-    total = t1-t0
-    print(f"Runtime for 1 query with dim={dimensions}, documents_n={n}: {np.round(total,3)} seconds")
+# one warmed-up, repeated benchmark per corpus size (generating the data is not timed)
+results = sweep("dot+argsort", setup, n_runs, param="documents_n", repeat=10, dim=dimensions)
+
+for result in results:
+    print(format_result(result))
+total = results[-1]["stats"]["p50_ms"] / 1e3
 
 
 # In[ ]:
@@ -173,6 +208,177 @@ for n in n_runs:
 print (f"To run 1,000 queries: {total * 1_000/60 : .2f} minutes")
 
 
+# ## Partial top-k selection
+# We only print the top 5, but `np.argsort` sorts the whole corpus.
+# `topk` selects the winners with `np.argpartition` in linear time and sorts only those `k`.
+
+# In[ ]:
+
+
+from knn import topk
+
+ids, scores = topk(similarities, 5)
+
+print("Top 5 results:")
+for k, s in zip(ids, scores):
+    print(f"Point: {k}, Similarity: {s}")
+
+
+# In[ ]:
+
+
+# Full sort vs partial selection (similarities already computed, median of 20 runs)
+for n in n_runs:
+    similarities = np.random.randn(n)
+    assert np.array_equal(np.argsort(-similarities)[:5], topk(similarities, 5)[0])
+
+    sort_result = bench("argsort", lambda: np.argsort(-similarities)[:5], documents_n=n)
+    topk_result = bench("topk", lambda: topk(similarities, 5), documents_n=n)
+    results += [sort_result, topk_result]
+
+    sort_time, topk_time = sort_result["stats"]["p50_ms"] / 1e3, topk_result["stats"]["p50_ms"] / 1e3
+    print(f"documents_n={n}: argsort {sort_time: .5f}s, topk {topk_time: .5f}s, "
+          f"speedup {sort_time/topk_time: .1f}x")
+
+
+# ## Running many queries at once
+# Rather than multiplying the time of one query by 1,000, run the 1,000 queries as one batch.
+# `search` scores tiles of queries against blocks of the corpus with one matrix multiply each,
+# keeping only the running top-k, so memory stays bounded while throughput grows with the batch.
+
+# In[ ]:
+
+
+from knn import search
+
+embeddings = np.random.randn(n_runs[-1], dimensions).astype(np.float32)
+queries = np.random.randn(1_000, dimensions).astype(np.float32)
+
+for q in [1, 10, 100, 1_000]:
+    result = bench("search", lambda: search(queries[:q], embeddings, k=5), repeat=5, items=q,
+                   queries=q, documents_n=n_runs[-1])
+    results.append(result)
+
+    total = result["stats"]["p50_ms"] / 1e3
+    print(f"{q} queries, documents_n={n_runs[-1]}: {np.round(total,3)} seconds, "
+          f"{result['stats']['per_second']: .1f} queries/s")
+
+
+# In[ ]:
+
+
+print (f"To run 1,000 queries: {total/60 : .2f} minutes")
+
+
+# ## Sharding the corpus across cores
+# Split the corpus into shards, search every shard on a worker pool and merge the per-shard top-k.
+# The results are identical to searching the whole corpus at once.
+
+# In[ ]:
+
+
+import os
+from knn import sharded_search
+
+ids_1, scores_1 = search(queries, embeddings, k=5)
+
+base = summarize(measure(lambda: sharded_search(queries, embeddings, k=5, n_shards=1), repeat=5))["p50_ms"] / 1e3
+
+for workers in [1, 2, 4, 8, 16]:
+    if workers > os.cpu_count():
+        break
+    ids, scores = sharded_search(queries, embeddings, k=5, n_shards=workers)
+    assert np.array_equal(ids, ids_1)
+
+    result = bench("sharded_search", lambda: sharded_search(queries, embeddings, k=5, n_shards=workers),
+                   repeat=5, items=len(queries), workers=workers)
+    results.append(result)
+    total = result["stats"]["p50_ms"] / 1e3
+    print(f"{workers} workers: {np.round(total,3)} seconds, speedup {base/total: .2f}x")
+
+
+# ## Compressing the vectors: product quantization
+# A 768-dim float64 vector takes 6KB. Product quantization splits it into 96 sub-vectors of 8 dims
+# and stores, for each, the id of the nearest of 256 learned centroids: 96 bytes per vector.
+# Queries are scored straight from the codes with a per-query lookup table, and the best
+# candidates can be re-ranked exactly against the original vectors.
+
+# In[ ]:
+
+
+from quantization import PQIndex
+
+embeddings = np.random.randn(n_runs[2], dimensions)
+queries = np.random.randn(100, dimensions)
+true_ids, _ = search(queries, embeddings, k=5)
+
+t0 = time.perf_counter()
+pq_index = PQIndex.build(embeddings, m=96, n_iter=10)
+t1 = time.perf_counter()
+print(f"PQ training + encoding: {t1-t0: .1f} seconds")
+print(f"float64: {embeddings.nbytes/1e6: .1f} MB, PQ codes: {pq_index.codes.nbytes/1e6: .1f} MB "
+      f"({embeddings.nbytes/pq_index.codes.nbytes: .0f}x smaller)")
+
+for rerank in [None, 50, 200]:
+    ids, _ = pq_index.search(queries, k=5, metric="dot", rerank=rerank)
+    stats = summarize(measure(lambda: pq_index.search(queries, k=5, metric="dot", rerank=rerank), repeat=5),
+                      items=len(queries))
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids, true_ids)])
+    print(f"rerank={rerank}: recall@5 {recall: .3f}, {stats['per_second']: .1f} queries/s")
+
+
+# ## Scalar quantization: int8 and float16
+# A simpler kind of compression: store every dimension as an int8 (scaled between that
+# dimension's min and max) or as a float16. The dot product runs directly on the quantized rows.
+
+# In[ ]:
+
+
+from quantization import ScalarQuantizedIndex
+
+stats = summarize(measure(lambda: search(queries, embeddings, k=5), repeat=5), items=len(queries))
+print(f"float64: {embeddings.nbytes/1e6: .1f} MB, {stats['per_second']: .1f} queries/s")
+
+for dtype in ["float16", "int8"]:
+    sq_index = ScalarQuantizedIndex.build(embeddings, dtype)
+    ids, _ = sq_index.search(queries, k=5, metric="dot")
+    stats = summarize(measure(lambda: sq_index.search(queries, k=5, metric="dot"), repeat=5), items=len(queries))
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids, true_ids)])
+    print(f"{dtype}: {sq_index.codes.nbytes/1e6: .1f} MB ({embeddings.nbytes/sq_index.codes.nbytes: .0f}x smaller), "
+          f"recall@5 {recall: .3f}, {stats['per_second']: .1f} queries/s")
+
+
+# ## Binary quantization with a Hamming prefilter
+# Keep only the sign of every dimension: 1 bit instead of 64, packed into uint64 words.
+# The first stage ranks the whole corpus by Hamming distance (XOR + popcount), then only the
+# best candidates are re-ranked by exact cosine distance on the float vectors.
+
+# In[ ]:
+
+
+from quantization import BinaryIndex
+
+true_cosine_ids, _ = search(queries, embeddings, k=5, metric="cosine")
+binary_index = BinaryIndex.build(embeddings)
+print(f"binary codes: {binary_index.nbytes/1e6: .2f} MB ({embeddings.nbytes/binary_index.nbytes: .0f}x smaller than float64)")
+
+for rerank in [None, 100, 1_000]:
+    ids, _ = binary_index.search(queries, k=5, rerank=rerank)
+    stats = summarize(measure(lambda: binary_index.search(queries, k=5, rerank=rerank), repeat=5), items=len(queries))
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids, true_cosine_ids)])
+    print(f"rerank={rerank}: recall@5 {recall: .3f}, {stats['per_second']: .1f} queries/s")
+
+
+# ## Saving the measurements
+# Every `bench` result above is a plain dict; store them with the Python / numpy version, CPU
+# and git commit they were measured on, so runs on different machines or commits can be compared.
+
+# In[ ]:
+
+
+write_json(results, "knn_benchmarks.json")
+
+
 # In[ ]:
 
 
@@ -70,7 +70,12 @@ nx.draw(G_best, pos_best, with_labels=True, node_size=200, node_color=[[0.85,0.7
 # In[ ]:
 
 
-GraphArray = construct_HNSW(vec_pos,m_nearest_neighbor)
+from hnsw import HNSW
+
+# Array-backed index: float32 vectors plus fixed-width int32 neighbour lists per layer.
+# to_networkx() turns each layer back into an nx.Graph for the plots below.
+index = HNSW.build(vec_pos, M=m_nearest_neighbor, ef_construction=20)
+GraphArray = index.to_networkx()
 
 for layer_i in range(len(GraphArray)-1,-1,-1):
     fig, axs = plt.subplots()
@@ -93,7 +98,7 @@ for layer_i in range(len(GraphArray)-1,-1,-1):
 # In[ ]:
 
 
-(SearchPathGraphArray, EntryGraphArray) = search_HNSW(GraphArray,G_query)
+(SearchPathGraphArray, EntryGraphArray) = index.search_graphs(query_vec)
 
 for layer_i in range(len(GraphArray)-1,-1,-1):
     fig, axs = plt.subplots()
@@ -117,6 +122,41 @@ for layer_i in range(len(GraphArray)-1,-1,-1):
     plt.show()
 
 
+# In[ ]:
+
+
+# The same search without the plotting: a beam search with ef_search candidates on layer 0
+ids, distances = index.search(query_vec, k=3, ef_search=10)
+print("HNSW nearest neighbours:", ids, distances)
+
+
+# In[ ]:
+
+
+# Save the index, then memory-map it back: no rebuild and no deserialization pass
+index.save("ann_lesson.hnsw")
+index = HNSW.load("ann_lesson.hnsw")
+print("HNSW nearest neighbours after reload:", *index.search(query_vec, k=3, ef_search=10))
+
+
+# ### Recall vs. latency
+# HNSW trades accuracy for speed. `bench_ann` builds HNSW and brute force over the same data and
+# sweeps `ef_search`, reporting recall@k, queries per second and p50/p99 latency.
+# It also covers IVF, which clusters the vectors with k-means and only scans the `nprobe` nearest clusters:
+# much faster to build and smaller than HNSW.
+# From the command line: `python bench_ann.py --n 10000 --dim 64 --M 8 16 --nprobe 1 4 16 --out results.json`
+
+# In[ ]:
+
+
+import bench_ann
+
+for result in bench_ann.run([5_000], [64], M_values=[8], ef_values=[10, 20, 40, 80], nprobe_values=[1, 4, 16]):
+    knob = f"ef={result['ef_search']}" if "ef_search" in result else f"nprobe={result.get('nprobe', '-')}"
+    print(f"{result['engine']:12} {knob:10} recall={result['recall']:.3f} build={result['build_s']:.2f}s "
+          f"qps={result['qps']:8.1f} p99={result['p99_ms']:.2f}ms")
+
+
 # ## Pure Vector Search - with a vector database
 
 # In[ ]:
@@ -285,6 +325,29 @@ result = response["data"]["Get"]["MyCollection"]
 print(json.dumps(result, indent=2))
 
 
+# ### The same filtered search, locally
+# The filter is turned into a bitmap of allowed objects *before* the vector search, so we still get
+# `limit` hits back. A very selective filter is answered by scanning just the allowed vectors;
+# a broad one by walking the HNSW graph and only collecting allowed objects.
+
+# In[ ]:
+
+
+from filters import FilteredSearch
+
+local_index = HNSW.build([item["vector"] for item in data], M=2, metric="cosine")
+local_search = FilteredSearch(local_index, {
+    "title": [item["title"] for item in data],
+    "foo": [item["foo"] for item in data],
+})
+
+ids, distances = local_search.search(
+    [-0.012, 0.021, -0.23, -0.42, 0.5, 0.5], 2,
+    where={"path": ["foo"], "operator": "GreaterThan", "valueNumber": 44},
+)
+print(local_search.last_strategy, [(data[i]["title"], data[i]["foo"], float(d)) for i, d in zip(ids, distances)])
+
+
 # ### nearObject Example
 
 # In[ ]:
@@ -98,21 +98,28 @@ json_print(data[0])
 # In[ ]:
 
 
-with client.batch.configure(batch_size=5) as batch:
-    for i, d in enumerate(data):  # Batch import data
-        
-        print(f"importing question: {i+1}")
-        
-        properties = {
+from batch_import import BatchImporter, RestSender
+
+# Stream the objects to Weaviate's batch endpoint, several batches in flight at once
+objects = (
+    {
+        "class": "Question",
+        "properties": {
             "answer": d["Answer"],
             "question": d["Question"],
             "category": d["Category"],
-        }
-        
-        batch.add_data_object(
-            data_object=properties,
-            class_name="Question"
-        )
+        },
+    }
+    for d in data
+)
+
+options = EmbeddedOptions()
+sender = RestSender(f"http://{options.hostname}:{options.port}", headers={
+    "X-OpenAI-Api-BaseURL": os.environ['OPENAI_API_BASE'],
+    "X-OpenAI-Api-Key": openai.api_key,
+})
+stats = BatchImporter(sender, batch_size=5, max_in_flight=2).run(objects)
+print(stats.as_dict())
 
 
 # In[ ]:
@@ -122,6 +129,69 @@ count = client.query.aggregate("Question").with_meta_count().do()
 json_print(count)
 
 
+# ## Importing at scale
+# Batches of 5 with two requests in flight are fine for 10 questions, not for millions. The same
+# `BatchImporter` scales by streaming objects into larger batches and keeping more requests in
+# flight, while retrying rejected objects and printing progress once a second. Here it runs against a local stand-in for the batch endpoint that
+# takes 20ms per request and rejects 1% of the objects.
+
+# In[ ]:
+
+
+from batch_import import BatchImporter, RestSender, StandInServer, make_objects
+
+for batch_size, in_flight in [(5, 1), (100, 1), (100, 8)]:
+    with StandInServer(latency=0.02, failure_rate=0.01, seed=0) as server:
+        importer = BatchImporter(RestSender(server.url), batch_size, in_flight, backoff=0.05, progress_interval=None)
+        stats = importer.run(make_objects(5_000))
+    print(f"batch_size={batch_size}, in flight={in_flight}: {stats.objects_per_second:,.0f} objects/s, "
+          f"{stats.retried} retried, {stats.failed} failed")
+
+
+# ## Adaptive batch sizes
+# With `text2vec-openai` every batch waits for embedding calls, so a request takes longer the bigger
+# the batch, and too many at once get rate limited. Instead of guessing a fixed `batch_size`,
+# `AIMDController` grows the batch size and concurrency step by step while requests stay under
+# `target_latency`, and halves them when requests get slow or fail. Below, the stand-in plays a
+# vectorizer that embeds 2ms per object, times out after 0.5s and serves 4 requests at a time.
+
+# In[ ]:
+
+
+from batch_import import AIMDController
+
+vectorizer = dict(latency=0.01, per_object_latency=0.002, timeout=0.5, capacity=4, seed=0)
+
+for batch_size, in_flight in [(5, 1), (500, 8), (None, None)]:
+    controller = AIMDController(batch_size=5, max_in_flight=1, target_latency=0.25) if batch_size is None else None
+    with StandInServer(**vectorizer) as server:
+        importer = BatchImporter(RestSender(server.url), batch_size or 5, in_flight or 1, backoff=0.05,
+                                 progress_interval=None, controller=controller)
+        stats = importer.run(make_objects(5_000))
+    name = "adaptive" if controller else f"batch_size={batch_size}, in flight={in_flight}"
+    print(f"{name}: {stats.objects_per_second:,.0f} objects/s, {stats.failed} failed")
+
+print(stats.controller)
+
+
+# In[ ]:
+
+
+import matplotlib.pyplot as plt
+
+# How the controller moved: additive steps up, halving on slow or failed requests
+seconds, batch_sizes, in_flights, _ = zip(*controller.history)
+
+fig, ax = plt.subplots()
+ax.step(seconds, batch_sizes, where="post", label="batch size")
+ax.set_xlabel("seconds")
+ax.set_ylabel("batch size")
+ax2 = ax.twinx()
+ax2.step(seconds, in_flights, where="post", color="tab:orange", label="in flight")
+ax2.set_ylabel("requests in flight")
+fig.legend()
+
+
 # ## Let's Extract the vector that represents each question!
 
 # In[ ]:
@@ -276,6 +346,34 @@ client.data_object.delete(uuid=object_uuid, class_name="Question")
 json_print(client.query.aggregate("Question").with_meta_count().do())
 
 
+# ### CRUD on a local HNSW index
+# The vector index underneath has to handle these mutations too. Our local HNSW index supports
+# online `add`, `update` and `delete`: deletes are tombstones that searches skip, and once enough
+# of them pile up a background compaction relinks the graph around them.
+
+# In[ ]:
+
+
+import numpy as np
+from hnsw import HNSW
+
+vectors = np.array([v["_additional"]["vector"] for v in (
+    client.query.get("Question", ["question"]).with_additional("vector").do()["data"]["Get"]["Question"]
+)])
+
+local_index = HNSW.build(vectors, M=4, metric="cosine")
+print("Nearest to object 0:", local_index.search(vectors[0], k=3))
+
+# Create
+new_id = local_index.add(vectors[:1] + 0.01)[0]
+# Update
+local_index.update(new_id, vectors[1])
+print("Nearest to object 1:", local_index.search(vectors[1], k=3))
+# Delete
+local_index.delete(new_id)
+print("Nearest to object 1 after delete:", local_index.search(vectors[1], k=3))
+
+
 # In[ ]:
 
 
@@ -78,21 +78,28 @@ client.schema.create_class(class_obj)
 # In[ ]:
 
 
-with client.batch.configure(batch_size=5) as batch:
-    for i, d in enumerate(data):  # Batch import data
-        
-        print(f"importing question: {i+1}")
-        
-        properties = {
+from batch_import import BatchImporter, RestSender
+
+# Stream the objects to Weaviate's batch endpoint, several batches in flight at once
+objects = (
+    {
+        "class": "Question",
+        "properties": {
             "answer": d["Answer"],
             "question": d["Question"],
             "category": d["Category"],
-        }
-        
-        batch.add_data_object(
-            data_object=properties,
-            class_name="Question"
-        )
+        },
+    }
+    for d in data
+)
+
+options = EmbeddedOptions()
+sender = RestSender(f"http://{options.hostname}:{options.port}", headers={
+    "X-OpenAI-Api-BaseURL": os.environ['OPENAI_API_BASE'],
+    "X-OpenAI-Api-Key": openai.api_key,
+})
+stats = BatchImporter(sender, batch_size=5, max_in_flight=2).run(objects)
+print(stats.as_dict())
 
 
 # ## Queries
@@ -129,6 +136,30 @@ response = (
 json_print(response)
 
 
+# ### Sparse Search - local BM25 index
+# The same keyword search without a server: an inverted index over the `question`, `answer` and
+# `category` fields with compressed postings lists, scored with BM25 in-process.
+
+# In[ ]:
+
+
+from bm25 import BM25Index
+
+bm25_index = BM25Index.build(data, fields={"Question": 1, "Answer": 1, "Category": 1})
+
+ids, scores = bm25_index.search("animal", k=3)
+for i, score in zip(ids, scores):
+    print(f"{score:.4f}", {"question": data[i]["Question"], "answer": data[i]["Answer"]})
+
+
+# In[ ]:
+
+
+from benchmark import bench, format_result
+
+print(format_result(bench("bm25", lambda: bm25_index.search("animal", k=3), repeat=1000, documents_n=len(data))))
+
+
 # ### Hybrid Search
 
 # In[ ]:
@@ -173,6 +204,66 @@ response = (
 json_print(response)
 
 
+# ### Hybrid Search - in-process
+# Run the same hybrid query locally: the vectors Weaviate computed for every object are searched
+# exactly, the local BM25 index above provides the keyword hits, and the two are fused in numpy.
+# Both retrievals run once; every `alpha` after that only re-weights the same candidate arrays.
+
+# In[ ]:
+
+
+import numpy as np
+from hybrid import HybridSearch
+
+# Fetch the stored objects with their vectors, in the order of `data`
+response = (
+    client.query
+    .get("Question", ["question"])
+    .with_additional(["vector"])
+    .with_limit(len(data))
+    .do()
+)
+vectors_by_question = {o["question"]: o["_additional"]["vector"] for o in response["data"]["Get"]["Question"]}
+embeddings = np.array([vectors_by_question[d["Question"]] for d in data], dtype=np.float32)
+
+def embed(text):
+    return openai.Embedding.create(input=[text], engine="text-embedding-ada-002")["data"][0]["embedding"]
+
+hybrid = HybridSearch(bm25_index, embeddings, metric="cosine", encode_fn=embed)
+candidates = hybrid.retrieve("animal")
+
+for alpha in [0.5, 0, 1]:
+    print(f"alpha={alpha}")
+    ids, scores = candidates.fuse(alpha, k=3)
+    for i, score in zip(ids, scores):
+        print(f"  {score:.4f}", {"question": data[i]["Question"], "answer": data[i]["Answer"]})
+
+
+# In[ ]:
+
+
+# Reciprocal rank fusion instead of normalized scores
+ids, scores = candidates.fuse(0.5, k=3, fusion="ranked")
+for i, score in zip(ids, scores):
+    print(f"{score:.4f}", {"question": data[i]["Question"], "answer": data[i]["Answer"]})
+
+
+# ### Tuning alpha
+# Rather than one query per alpha, retrieve every query once and rank the whole alpha grid in a
+# single pass. Here each category name is a query and the questions in that category are relevant.
+
+# In[ ]:
+
+
+categories = sorted({d["Category"] for d in data})
+queries = [c.lower() for c in categories]
+relevant = [[i for i, d in enumerate(data) if d["Category"] == c] for c in categories]
+
+metrics = hybrid.evaluate(queries, relevant, alphas=np.linspace(0, 1, 11), k=3)
+for row in zip(*metrics.values()):
+    print(", ".join(f"{name}={value:.2f}" for name, value in zip(metrics, row)))
+
+
 # In[ ]:
 
 
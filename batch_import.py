@@ -0,0 +1,482 @@
+"""Pipelined batch import into Weaviate.
+
+`client.batch` with `batch_size=5` sends one small request at a time and the
+lessons print a line per object. `BatchImporter` instead reads the objects
+as a stream, packs them into batches of `batch_size` and keeps up to
+`max_in_flight` batch requests running on a thread pool. When that many are
+in flight, reading the source waits for one to finish (backpressure), so
+memory stays bounded however many objects are imported. Objects the server
+rejects, or whose whole request failed, are retried in later batches with
+exponential backoff, up to `max_retries` times. Progress is printed at most
+once every `progress_interval` seconds.
+
+    sender = RestSender("http://localhost:8079", headers={"X-OpenAI-Api-Key": key})
+    stats = BatchImporter(sender, batch_size=100, max_in_flight=4).run(objects)
+
+With an `AIMDController` the batch size and the number of requests in flight
+are tuned during the import instead: both grow additively while requests
+succeed within `target_latency`, and shrink multiplicatively when requests
+get slow or fail, e.g. when the vectorizer module times out or is rate
+limited. The chosen values are reported in the stats.
+
+    controller = AIMDController(target_latency=2.0)
+    stats = BatchImporter(sender, controller=controller).run(objects)
+
+`objects` are Weaviate REST objects, `{"class": ..., "properties": {...}}`
+with an optional `"vector"`. `StandInServer` is a local fake of the batch
+endpoint with configurable latency and failure rate, and can mimic a
+vectorizer whose latency grows with the batch and which times out or rate
+limits, for measuring the importer without a database:
+
+    python batch_import.py --objects 100000 --batch-size 100 --in-flight 8 --latency 0.02
+    python batch_import.py --adaptive --per-object-latency 0.002 --timeout 0.5 --capacity 4
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+BATCH_PATH = "/v1/batch/objects"
+
+
+class ImportStats:
+    """Counters of one import run."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.batch_size = None
+        self.max_in_flight = None
+        self.controller = None
+
+    @property
+    def objects_per_second(self):
+        elapsed = self.elapsed or time.perf_counter() - self.started
+        return self.imported / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        stats = {
+            "imported": self.imported, "failed": self.failed, "retried": self.retried, "batches": self.batches,
+            "elapsed_s": self.elapsed, "objects_per_second": self.objects_per_second,
+            "batch_size": self.batch_size, "max_in_flight": self.max_in_flight,
+        }
+        if self.controller is not None:
+            stats["controller"] = self.controller
+        return stats
+
+
+class ProgressReporter:
+    """Prints import progress at most once every `interval` seconds."""
+
+    def __init__(self, interval=1.0, out=print):
+        self.interval = interval
+        self.out = out
+        self._last = time.perf_counter()
+
+    def update(self, stats, force=False):
+        now = time.perf_counter()
+        if self.interval is None or (not force and now - self._last < self.interval):
+            return
+        self._last = now
+        self.out(f"imported {stats.imported:,} objects ({stats.objects_per_second:,.0f}/s), "
+                 f"{stats.failed:,} failed, {stats.retried:,} retried, "
+                 f"batch_size={stats.batch_size}, in flight={stats.max_in_flight}")
+
+
+class RestSender:
+    """Sends one batch to Weaviate's `POST /v1/batch/objects`.
+
+    Returns the `(position, error)` of every object the server rejected, and
+    raises if the request itself failed. Each worker thread keeps its own
+    keep-alive connection.
+    """
+
+    def __init__(self, url, headers=None, timeout=60):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port
+        self.https = parts.scheme == "https"
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "connection", None) is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._local.connection = cls(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def __call__(self, objects):
+        body = json.dumps({"objects": objects})
+        connection = self._connection()
+        try:
+            connection.request("POST", BATCH_PATH, body, self.headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+        if response.status >= 400:
+            raise RuntimeError(f"batch request failed with HTTP {response.status}: {payload[:200]!r}")
+
+        failures = []
+        for i, result in enumerate(json.loads(payload)):
+            errors = (result.get("result") or {}).get("errors")
+            if errors:
+                failures.append((i, "; ".join(e.get("message", "") for e in errors.get("error", []))))
+        return failures
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease tuning of batch size and concurrency.
+
+    After every batch, `observe` gets its size, latency and number of failed
+    objects:
+
+    - error rate above `max_error_rate`: both the batch size and the number
+      of requests in flight are multiplied by `decrease`;
+    - latency above `target_latency`: the batch size is multiplied by
+      `decrease` (bigger batches take longer, concurrency is left alone);
+    - otherwise the batch size grows by `batch_increase`, and every
+      `in_flight_every` such batches one more request may be in flight.
+
+    Every change starts a new generation; batches sent under an older one
+    reflect settings that no longer apply and are ignored, so one slow round
+    of requests causes one decrease, not one per batch.
+    """
+
+    def __init__(self, batch_size=10, max_in_flight=1, batch_size_range=(1, 1000), in_flight_range=(1, 16),
+                 target_latency=1.0, max_error_rate=0.05, batch_increase=10, in_flight_every=4, decrease=0.5,
+                 smoothing=0.2):
+        if not 0 < decrease < 1:
+            raise ValueError(f"decrease must be between 0 and 1, got {decrease}")
+        self.batch_size_range = batch_size_range
+        self.in_flight_range = in_flight_range
+        self.batch_size = int(min(max(batch_size, batch_size_range[0]), batch_size_range[1]))
+        self.max_in_flight = int(min(max(max_in_flight, in_flight_range[0]), in_flight_range[1]))
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.batch_increase = batch_increase
+        self.in_flight_every = in_flight_every
+        self.decrease = decrease
+        self.smoothing = smoothing
+
+        self.generation = 0
+        self.increases = 0
+        self.decreases = 0
+        self.latency = None
+        self.error_rate = None
+        self._successes = 0
+        self._started = time.perf_counter()
+        # (seconds since start, batch size, max in flight, reason) after every change
+        self.history = [(0.0, self.batch_size, self.max_in_flight, "start")]
+        self._lock = threading.Lock()
+
+    def _ewma(self, old, value):
+        return value if old is None else (1 - self.smoothing) * old + self.smoothing * value
+
+    def _set(self, batch_size, max_in_flight, reason):
+        lo, hi = self.batch_size_range
+        batch_size = int(min(max(batch_size, lo), hi))
+        lo, hi = self.in_flight_range
+        max_in_flight = int(min(max(max_in_flight, lo), hi))
+        if (batch_size, max_in_flight) == (self.batch_size, self.max_in_flight):
+            return
+        self.batch_size, self.max_in_flight = batch_size, max_in_flight
+        self.generation += 1
+        self.history.append((time.perf_counter() - self._started, batch_size, max_in_flight, reason))
+
+    def observe(self, generation, n_objects, n_failed, latency):
+        """Record one finished batch sent under `generation`."""
+        with self._lock:
+            error_rate = n_failed / max(n_objects, 1)
+            self.latency = self._ewma(self.latency, latency)
+            self.error_rate = self._ewma(self.error_rate, error_rate)
+            if generation != self.generation:
+                return
+
+            if error_rate > self.max_error_rate:
+                self.decreases += 1
+                self._successes = 0
+                self._set(self.batch_size * self.decrease, self.max_in_flight * self.decrease, "errors")
+            elif latency > self.target_latency:
+                self.decreases += 1
+                self._successes = 0
+                self._set(self.batch_size * self.decrease, self.max_in_flight, "latency")
+            else:
+                self.increases += 1
+                self._successes += 1
+                more = self._successes % self.in_flight_every == 0
+                self._set(self.batch_size + self.batch_increase, self.max_in_flight + more, "increase")
+
+    def metrics(self):
+        return {
+            "batch_size": self.batch_size, "max_in_flight": self.max_in_flight,
+            "latency_ewma_s": self.latency, "error_rate_ewma": self.error_rate,
+            "increases": self.increases, "decreases": self.decreases, "changes": len(self.history) - 1,
+        }
+
+
+class BatchImporter:
+    def __init__(self, send_fn, batch_size=100, max_in_flight=4, max_retries=3, backoff=0.5,
+                 progress_interval=1.0, out=print, controller=None):
+        """`send_fn(objects)` sends one batch and returns the `(position, error)` of rejected objects;
+        raising marks the whole batch as failed. `progress_interval=None` disables progress output.
+        With a `controller` (an `AIMDController`), its batch size and concurrency are used instead
+        of `batch_size` and `max_in_flight`, and adjusted after every batch.
+        """
+        if controller is not None:
+            batch_size, max_in_flight = controller.batch_size, controller.max_in_flight
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be positive")
+        self.send_fn = send_fn
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress = ProgressReporter(progress_interval, out)
+        self.controller = controller
+
+    def _next_batch(self, source, retry):
+        """Up to `batch_size` `(object, attempt)` pairs, retries first."""
+        batch = []
+        while retry and len(batch) < self.batch_size:
+            batch.append(retry.popleft())
+        batch += itertools.islice(source, self.batch_size - len(batch))
+        return batch
+
+    def _send(self, batch):
+        """Send one batch; returns `(position, error)` failures and the request latency in seconds."""
+        attempt = max(a for _, a in batch)
+        if attempt:
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+        t0 = time.perf_counter()
+        try:
+            failures = self.send_fn([obj for obj, _ in batch])
+        except Exception as e:
+            failures = [(i, f"{type(e).__name__}: {e}") for i in range(len(batch))]
+        return failures, time.perf_counter() - t0
+
+    def _collect(self, batch, generation, future, retry, stats):
+        failures, latency = future.result()
+        for i, error in failures:
+            obj, attempt = batch[i]
+            if attempt < self.max_retries:
+                retry.append((obj, attempt + 1))
+                stats.retried += 1
+            else:
+                stats.failed += 1
+                stats.errors.append((obj, error))
+        stats.imported += len(batch) - len(failures)
+        stats.batches += 1
+        if self.controller is not None:
+            self.controller.observe(generation, len(batch), len(failures), latency)
+            self.batch_size, self.max_in_flight = self.controller.batch_size, self.controller.max_in_flight
+        stats.batch_size, stats.max_in_flight = self.batch_size, self.max_in_flight
+        self.progress.update(stats)
+        return failures, latency
+
+    def run(self, objects):
+        """Import every object of the iterable `objects`; returns the `ImportStats`."""
+        stats = ImportStats()
+        source = ((obj, 0) for obj in objects)
+        retry = deque()
+        in_flight = {}
+        stats.batch_size, stats.max_in_flight = self.batch_size, self.max_in_flight
+        workers = self.controller.in_flight_range[1] if self.controller is not None else self.max_in_flight
+        with ThreadPoolExecutor(workers) as executor:
+            while True:
+                # backpressure: don't read further ahead than the batches in flight
+                while len(in_flight) >= self.max_in_flight:
+                    self._wait(in_flight, retry, stats)
+                batch = self._next_batch(source, retry)
+                if batch:
+                    generation = self.controller.generation if self.controller is not None else 0
+                    in_flight[executor.submit(self._send, batch)] = batch, generation
+                elif in_flight:
+                    self._wait(in_flight, retry, stats)
+                else:
+                    break
+        stats.elapsed = time.perf_counter() - stats.started
+        if self.controller is not None:
+            stats.controller = self.controller.metrics()
+        self.progress.update(stats, force=True)
+        return stats
+
+    def _wait(self, in_flight, retry, stats):
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            self._collect(*in_flight.pop(future), future, retry, stats)
+
+
+# -- local stand-in for the batch endpoint --------------------------------
+
+
+class StandInServer:
+    """A fake Weaviate batch endpoint on localhost.
+
+    Every request sleeps `latency + per_object_latency * len(objects)`
+    seconds, rejects each object with probability `failure_rate`, and fails
+    as a whole (HTTP 503) with probability `request_failure_rate`. Accepted
+    objects are only counted.
+
+    To stand in for a vectorizer module, `per_object_latency` is the
+    embedding cost per object, a request that would take longer than
+    `timeout` fails (HTTP 504) after `timeout` seconds, and requests beyond
+    `capacity` running at once are rejected as rate limited (HTTP 429).
+    """
+
+    def __init__(self, latency=0.01, per_object_latency=0.0, failure_rate=0.0, request_failure_rate=0.0,
+                 timeout=None, capacity=None, port=0, seed=None):
+        self.latency = latency
+        self.per_object_latency = per_object_latency
+        self.failure_rate = failure_rate
+        self.request_failure_rate = request_failure_rate
+        self.timeout = timeout
+        self.capacity = capacity
+        self.count = 0
+        self.requests = 0
+        self.active = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self, n_objects):
+        """Seconds one request for `n_objects` takes."""
+        return self.latency + self.per_object_latency * n_objects
+
+    def handle_batch(self, objects):
+        """`(status, results)` for one batch request."""
+        with self._lock:
+            self.requests += 1
+            if self.capacity is not None and self.active >= self.capacity:
+                return 429, {"error": [{"message": "rate limited"}]}
+            self.active += 1
+        try:
+            delay = self.delay(len(objects))
+            if self.timeout is not None and delay > self.timeout:
+                time.sleep(self.timeout)
+                return 504, {"error": [{"message": "vectorizer timed out"}]}
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+        with self._lock:
+            if self._rng.random() < self.request_failure_rate:
+                return 503, {"error": [{"message": "service unavailable"}]}
+            rejected = [self._rng.random() < self.failure_rate for _ in objects]
+            self.count += len(objects) - sum(rejected)
+        results = []
+        for obj, reject in zip(objects, rejected):
+            result = {"errors": {"error": [{"message": "simulated failure"}]}} if reject else {}
+            results.append({**obj, "result": result})
+        return 200, results
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # headers and body are written separately; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path != BATCH_PATH:
+                    status, payload = 404, {"error": [{"message": f"no route {self.path}"}]}
+                else:
+                    status, payload = server.handle_batch(json.loads(body)["objects"])
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_objects(n, class_name="Question", dim=0, seed=0):
+    """`n` synthetic Jeopardy-like objects, generated lazily."""
+    rng = random.Random(seed)
+    for i in range(n):
+        obj = {"class": class_name,
+               "properties": {"question": f"question {i}", "answer": f"answer {i}", "category": f"C{i % 50}"}}
+        if dim:
+            obj["vector"] = [rng.random() for _ in range(dim)]
+        yield obj
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch import throughput against a local stand-in server")
+    parser.add_argument("--objects", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=0, help="attach random vectors of this size")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per request")
+    parser.add_argument("--per-object-latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--request-failure-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, help="server side timeout per request, in seconds")
+    parser.add_argument("--capacity", type=int, help="concurrent requests the server accepts")
+    parser.add_argument("--adaptive", action="store_true", help="tune batch size and concurrency with AIMD")
+    parser.add_argument("--target-latency", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    controller = None
+    if args.adaptive:
+        controller = AIMDController(args.batch_size, args.in_flight, target_latency=args.target_latency)
+    with StandInServer(args.latency, args.per_object_latency, args.failure_rate, args.request_failure_rate,
+                       args.timeout, args.capacity, seed=args.seed) as server:
+        importer = BatchImporter(RestSender(server.url), args.batch_size, args.in_flight, backoff=0.05,
+                                 controller=controller)
+        stats = importer.run(make_objects(args.objects, dim=args.dim, seed=args.seed))
+    print(json.dumps({"args": vars(args), **stats.as_dict(), "server_count": server.count}))
+
+
+if __name__ == "__main__":
+    main()
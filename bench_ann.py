@@ -0,0 +1,163 @@
+"""Recall vs. latency benchmark: HNSW and IVF against exact brute force search.
+
+Builds the indexes over random data for every requested N / dim / M, sweeps
+the HNSW search beam width (`ef_search`) and the number of IVF lists probed
+(`nprobe`), and reports recall@k, queries per
+second, p50/p95/p99 latency, build time and index memory. Results are printed as
+one JSON object per line (and optionally written to a file) so runs can be
+compared and plotted.
+
+    python bench_ann.py --n 10000 50000 --dim 64 --M 8 16 --ef 16 32 64 128 --nprobe 1 4 16 --out results.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import benchmark
+import knn
+from distances import Corpus
+from hnsw import HNSW
+from ivf import IVF
+
+
+def recall_at_k(found, truth):
+    """Mean fraction of the true top-k ids present in each row of `found`."""
+    k = truth.shape[1]
+    hits = [len(set(f[:k].tolist()) & set(t.tolist())) for f, t in zip(found, truth)]
+    return float(np.mean(hits)) / k
+
+
+def time_queries(search_one, queries, warmup=10):
+    """Run `search_one(q)` for every query (after `warmup` untimed ones); returns the ids found and the latencies in ns."""
+    for q in queries[:warmup]:
+        search_one(q)
+    ids, latencies = [], np.empty(len(queries), dtype=np.int64)
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter_ns()
+        found, _ = search_one(q)
+        latencies[i] = time.perf_counter_ns() - t0
+        ids.append(found)
+    return ids, latencies
+
+
+def latency_stats(latencies):
+    stats = benchmark.summarize(latencies)
+    return {
+        "qps": float(len(latencies) * 1e9 / latencies.sum()),
+        "p50_ms": stats["p50_ms"],
+        "p95_ms": stats["p95_ms"],
+        "p99_ms": stats["p99_ms"],
+    }
+
+
+def make_data(n, dim, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n, dim), dtype=np.float32)
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+    return data, queries
+
+
+def bench_brute_force(data, queries, k, metric):
+    # row norms and layout are prepared once, like an index build, not per query
+    t0 = time.perf_counter()
+    corpus = Corpus(data)
+    build_s = time.perf_counter() - t0
+
+    def search_one(q):
+        ids, scores = knn.search(q, corpus, k, metric)
+        return ids[0], scores[0]
+
+    _, latencies = time_queries(search_one, queries)
+    truth, _ = knn.search(queries, corpus, k, metric)
+    result = {"engine": "brute_force", "recall": 1.0, "build_s": build_s, "memory_bytes": int(data.nbytes)}
+    result.update(latency_stats(latencies))
+    return result, truth
+
+
+def bench_hnsw(data, queries, truth, k, metric, M, ef_construction, ef_values, seed=0, n_workers=1):
+    t0 = time.perf_counter()
+    index = HNSW.build(data, n_workers=n_workers, M=M, ef_construction=ef_construction, metric=metric, seed=seed)
+    build_s = time.perf_counter() - t0
+
+    results = []
+    for ef in ef_values:
+        found, latencies = time_queries(lambda q: index.search(q, k, ef_search=ef), queries)
+        result = {
+            "engine": "hnsw", "M": M, "ef_construction": ef_construction, "ef_search": ef, "build_workers": n_workers,
+            "recall": recall_at_k(found, truth), "build_s": build_s, "memory_bytes": int(index.nbytes),
+        }
+        result.update(latency_stats(latencies))
+        results.append(result)
+    return results
+
+
+def bench_ivf(data, queries, truth, k, metric, n_lists, nprobe_values, seed=0):
+    t0 = time.perf_counter()
+    index = IVF.build(data, n_lists, metric=metric, seed=seed)
+    build_s = time.perf_counter() - t0
+
+    results = []
+    for nprobe in nprobe_values:
+        found, latencies = time_queries(lambda q: index.search(q, k, nprobe=nprobe), queries)
+        result = {
+            "engine": "ivf", "n_lists": index.n_lists, "nprobe": nprobe,
+            "recall": recall_at_k(found, truth), "build_s": build_s, "memory_bytes": int(index.nbytes),
+        }
+        result.update(latency_stats(latencies))
+        results.append(result)
+    return results
+
+
+def run(n_values, dim_values, M_values, ef_values, k=10, n_queries=200, ef_construction=100,
+        metric="l2", seed=0, n_workers=1, nprobe_values=(), n_lists=None):
+    """Yield one result dict per (engine, configuration)."""
+    for n in n_values:
+        for dim in dim_values:
+            data, queries = make_data(n, dim, n_queries, seed)
+            common = {"n": n, "dim": dim, "k": k, "metric": metric, "n_queries": n_queries}
+
+            result, truth = bench_brute_force(data, queries, k, metric)
+            yield {**common, **result}
+            for M in M_values:
+                for result in bench_hnsw(data, queries, truth, k, metric, M, ef_construction, ef_values,
+                                         seed, n_workers):
+                    yield {**common, **result}
+            if nprobe_values:
+                for result in bench_ivf(data, queries, truth, k, metric, n_lists, nprobe_values, seed):
+                    yield {**common, **result}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--dim", type=int, nargs="+", default=[64])
+    parser.add_argument("--M", type=int, nargs="+", default=[16])
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16],
+                        help="IVF lists probed per query; pass no values to skip IVF")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default 4 * sqrt(n))")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--metric", choices=["l2", "cosine"], default="l2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--build-workers", type=int, default=1, help="> 1 builds HNSW with add_bulk")
+    parser.add_argument("--out", help="also write all results, with the environment they ran in, to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for result in run(args.n, args.dim, args.M, args.ef, args.k, args.queries,
+                      args.ef_construction, args.metric, args.seed, args.build_workers,
+                      args.nprobe, args.nlist):
+        print(json.dumps(result), flush=True)
+        results.append(result)
+
+    if args.out:
+        benchmark.write_json(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Latency / throughput benchmarking helpers.
+
+Replaces single `time.time()` deltas with repeated, warmed-up measurements:
+`measure` times a callable with `time.perf_counter_ns` after `warmup` untimed
+calls, `summarize` reduces the samples to mean / p50 / p95 / p99 and
+throughput, and `sweep` runs one benchmark per corpus size (or any other
+parameter) with setup kept out of the timings. Results are plain dicts that
+`write_json` stores together with the machine and commit they came from.
+
+Run directly for the kNN lesson's brute force sweeps:
+
+    python benchmark.py --sizes 1000 10000 100000 500000 --out knn.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def measure(fn, warmup=3, repeat=20):
+    """Call `fn()` `warmup` times untimed, then `repeat` times; returns the timings in ns."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat, dtype=np.int64)
+    for i in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples[i] = time.perf_counter_ns() - t0
+    return samples
+
+
+def summarize(samples_ns, items=1):
+    """Summary statistics for timings in ns; `items` is the work done per call (e.g. queries)."""
+    ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    return {
+        "repeat": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "per_second": float(items * 1e3 / np.median(ms)),
+    }
+
+
+def bench(name, fn, warmup=3, repeat=20, items=1, **params):
+    """Measure `fn` and return `{"name", "params", "stats"}`."""
+    return {"name": name, "params": params, "stats": summarize(measure(fn, warmup, repeat), items)}
+
+
+def sweep(name, setup, values, param="n", warmup=3, repeat=20, items=1, **params):
+    """One `bench` per value: `setup(value)` builds the callable to time (setup is not timed)."""
+    results = []
+    for value in values:
+        fn = setup(value)
+        results.append(bench(name, fn, warmup, repeat, items, **{param: value}, **params))
+    return results
+
+
+def format_result(result):
+    stats = result["stats"]
+    params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+    return (f"{result['name']} ({params}): p50 {stats['p50_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms, "
+            f"p99 {stats['p99_ms']:.3f} ms, {stats['per_second']:,.1f}/s")
+
+
+def environment():
+    """Where the results came from: interpreter, numpy, machine and git commit."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_json(results, path):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+
+# -- kNN lesson sweeps ---------------------------------------------------
+
+
+def knn_sweeps(sizes, dim=768, n_queries=1, k=5, warmup=3, repeat=20, seed=42):
+    """Full argsort vs. `topk` vs. batched `search` over corpus sizes, as in the kNN lesson."""
+    import knn
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sizes:
+        embeddings = rng.standard_normal((n, dim), dtype=np.float32)
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+        params = {"n": n, "dim": dim, "n_queries": n_queries, "k": k}
+        results.append(bench("dot+argsort", lambda: np.argsort(-(embeddings @ queries.T), axis=0)[:k],
+                             warmup, repeat, n_queries, **params))
+        results.append(bench("dot+topk", lambda: knn.topk((queries @ embeddings.T), k),
+                             warmup, repeat, n_queries, **params))
+        results.append(bench("knn.search", lambda: knn.search(queries, embeddings, k),
+                             warmup, repeat, n_queries, **params))
+    return results
+
+
+def speed_test_sweep(sizes, k=4, warmup=1, repeat=5, seed=42):
+    """The lesson's `speed_test`: one 2-d query against `count` random points."""
+    import knn
+
+    rng = np.random.default_rng(seed)
+
+    def setup(count):
+        data = rng.random((count, 2), dtype=np.float32)
+        return lambda: knn.search([[0.45, 0.2]], data, k, metric="l2")
+
+    return sweep("speed_test", setup, sizes, "count", warmup, repeat)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="kNN lesson benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 500_000])
+    parser.add_argument("--speed-test-sizes", type=int, nargs="*", default=[20_000, 200_000, 2_000_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", help="write results and environment to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = knn_sweeps(args.sizes, args.dim, args.queries, warmup=args.warmup, repeat=args.repeat)
+    results += speed_test_sweep(args.speed_test_sizes)
+    for result in results:
+        print(format_result(result))
+    if args.out:
+        write_json(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""In-process BM25 keyword search over an inverted index.
+
+Documents are tokenized into lowercase words (minus English stopwords) and
+indexed into postings lists: for every term, the ids of the documents that
+contain it and how often. Both are stored compressed, as variable-byte
+(LEB128) encoded doc id gaps and term frequencies in two flat uint8 buffers,
+and decoded with a handful of numpy operations. Every list is cut into
+blocks of `POSTINGS_BLOCK` postings whose byte offsets and last doc id are
+kept uncompressed, so a block can be decoded on its own and skipped without
+decoding it. Document lengths, IDF and every term's maximum possible score
+are computed once at build time.
+
+Top-k queries use MaxScore pruning. Terms are scored from the highest upper
+bound down. Once the k-th best score so far beats the summed bounds of the
+terms still to come, no new document can enter the top-k. From then on,
+candidates that cannot reach it even with every remaining term are dropped.
+The remaining terms decode only the blocks that hold a surviving candidate
+and score only those candidates, skipping the rest of their postings.
+
+Like Weaviate's BM25, several text fields can be searched at once, each with
+an integer boost:
+
+    index = BM25Index.build(data, fields={"Question": 1, "Answer": 1, "Category": 1})
+    ids, scores = index.search("animal", k=3)
+"""
+
+import re
+
+import numpy as np
+
+# postings per independently decodable block of a postings list
+POSTINGS_BLOCK = 128
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Lucene's (and Weaviate's "en" preset) English stopwords
+STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that the their then there these "
+    "they this to was will with".split()
+)
+
+
+def tokenize(text, stopwords=STOPWORDS):
+    """Lowercase word tokens of `text`, without `stopwords`."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in stopwords]
+
+
+def varint_encode(values):
+    """LEB128 encode non-negative integers: 7 bits per byte, high bit set on all but the last byte."""
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        n_bytes += rest > 0
+        rest >>= np.uint64(7)
+
+    out = np.empty(n_bytes.sum(), dtype=np.uint8)
+    starts = np.cumsum(n_bytes) - n_bytes
+    rest = values.copy()
+    for i in range(int(n_bytes.max(initial=0))):
+        active = n_bytes > i
+        more = n_bytes[active] > i + 1
+        out[starts[active] + i] = (rest[active] & np.uint64(0x7F)).astype(np.uint8) | (more.astype(np.uint8) << 7)
+        rest >>= np.uint64(7)
+    return out
+
+
+def varint_decode(buf):
+    """Inverse of `varint_encode`."""
+    buf = np.asarray(buf, dtype=np.uint8)
+    if not len(buf):
+        return np.empty(0, dtype=np.uint64)
+    last = (buf & 0x80) == 0
+    ends = np.flatnonzero(last)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    # position of every byte within its value
+    shift = np.arange(len(buf)) - np.repeat(starts, ends - starts + 1)
+    parts = (buf & 0x7F).astype(np.uint64) << (7 * shift).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _field_weights(fields):
+    if isinstance(fields, dict):
+        weights = dict(fields)
+    else:
+        weights = {field: 1 for field in fields}
+    for field, weight in weights.items():
+        if int(weight) != weight or weight < 1:
+            raise ValueError(f"field boosts must be positive integers, got {field}={weight}")
+    return {field: int(weight) for field, weight in weights.items()}
+
+
+class BM25Index:
+    def __init__(self, k1=1.2, b=0.75, stopwords=STOPWORDS):
+        self.k1 = k1
+        self.b = b
+        self.stopwords = stopwords
+        self.fields = None
+        self.vocab = {}
+        self.n_docs = 0
+        self.doc_lengths = np.empty(0, dtype=np.float32)
+        self.avgdl = 0.0
+        self.df = np.empty(0, dtype=np.int64)
+        self.idf = np.empty(0, dtype=np.float32)
+        self.max_scores = np.empty(0, dtype=np.float32)
+        # term t owns blocks term_blocks[t]:term_blocks[t + 1]; block b's bytes are
+        # block_doc_offsets[b]:block_doc_offsets[b + 1] (and likewise for tfs)
+        self.term_blocks = np.zeros(1, dtype=np.int64)
+        self.block_last = np.empty(0, dtype=np.int64)
+        self.block_doc_offsets = np.zeros(1, dtype=np.int64)
+        self.block_tf_offsets = np.zeros(1, dtype=np.int64)
+        self.doc_gaps = np.empty(0, dtype=np.uint8)
+        self.tfs = np.empty(0, dtype=np.uint8)
+        self._norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return self.n_docs
+
+    @property
+    def nbytes(self):
+        return (self.doc_gaps.nbytes + self.tfs.nbytes + self.term_blocks.nbytes + self.block_last.nbytes
+                + self.block_doc_offsets.nbytes + self.block_tf_offsets.nbytes
+                + self.doc_lengths.nbytes + self.idf.nbytes + self.max_scores.nbytes)
+
+    def _document_terms(self, doc):
+        """Term -> boosted frequency for one document (a string or a dict of fields)."""
+        if isinstance(doc, str):
+            doc = {None: doc}
+            weights = {None: 1}
+        else:
+            weights = self.fields
+        counts = {}
+        for field, weight in weights.items():
+            for token in tokenize(doc.get(field) or "", self.stopwords):
+                counts[token] = counts.get(token, 0) + weight
+        return counts
+
+    @classmethod
+    def build(cls, documents, fields=("question", "answer", "category"), k1=1.2, b=0.75, stopwords=STOPWORDS):
+        """Index `documents`: strings, or dicts whose `fields` (names, or a dict of name -> integer boost) are searched.
+
+        Document ids are positions in `documents`.
+        """
+        index = cls(k1, b, stopwords)
+        index.fields = _field_weights(fields)
+
+        postings = {}
+        lengths = []
+        for doc_id, doc in enumerate(documents):
+            counts = index._document_terms(doc)
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        index.n_docs = len(lengths)
+        index.doc_lengths = np.array(lengths, dtype=np.float32)
+        index.avgdl = float(index.doc_lengths.mean()) if index.n_docs else 0.0
+        index._norms = index._length_norms()
+
+        terms = sorted(postings)
+        index.vocab = {term: i for i, term in enumerate(terms)}
+        index.df = np.array([len(postings[t][0]) for t in terms], dtype=np.int64)
+        index.idf = np.log1p((index.n_docs - index.df + 0.5) / (index.df + 0.5)).astype(np.float32)
+
+        gap_chunks, tf_chunks, block_last, term_blocks, max_scores = [], [], [], [0], []
+        for term_id, term in enumerate(terms):
+            docs, tfs = (np.array(a, dtype=np.int64) for a in postings[term])
+            gaps = np.diff(docs, prepend=0)
+            for start in range(0, len(docs), POSTINGS_BLOCK):
+                gap_chunks.append(varint_encode(gaps[start:start + POSTINGS_BLOCK]))
+                tf_chunks.append(varint_encode(tfs[start:start + POSTINGS_BLOCK]))
+                block_last.append(docs[start:start + POSTINGS_BLOCK][-1])
+            term_blocks.append(len(block_last))
+            max_scores.append(index._scores(term_id, docs, tfs).max())
+        index.term_blocks = np.array(term_blocks, dtype=np.int64)
+        index.block_last = np.array(block_last, dtype=np.int64)
+        index.block_doc_offsets = np.concatenate([[0], np.cumsum([len(c) for c in gap_chunks], dtype=np.int64)])
+        index.block_tf_offsets = np.concatenate([[0], np.cumsum([len(c) for c in tf_chunks], dtype=np.int64)])
+        index.doc_gaps = np.concatenate(gap_chunks) if gap_chunks else np.empty(0, dtype=np.uint8)
+        index.tfs = np.concatenate(tf_chunks) if tf_chunks else np.empty(0, dtype=np.uint8)
+        index.max_scores = np.array(max_scores, dtype=np.float32)
+        return index
+
+    def _length_norms(self):
+        """k1 * (1 - b + b * dl / avgdl) for every document."""
+        if not self.n_docs:
+            return np.empty(0, dtype=np.float32)
+        return (self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avgdl)).astype(np.float32)
+
+    def _scores(self, term_id, docs, tfs):
+        tfs = tfs.astype(np.float32)
+        return self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self._norms[docs])
+
+    def postings(self, term_id):
+        """Decoded `(doc_ids, term_frequencies)` of one term."""
+        first, last = self.term_blocks[term_id], self.term_blocks[term_id + 1]
+        gaps = varint_decode(self.doc_gaps[self.block_doc_offsets[first]:self.block_doc_offsets[last]])
+        tfs = varint_decode(self.tfs[self.block_tf_offsets[first]:self.block_tf_offsets[last]])
+        return np.cumsum(gaps.astype(np.int64)), tfs
+
+    def _postings_for(self, term_id, docs):
+        """`(doc_ids, term_frequencies)` of one term, decoding only the blocks that may hold `docs`."""
+        first, last = self.term_blocks[term_id], self.term_blocks[term_id + 1]
+        blocks = first + np.unique(np.searchsorted(self.block_last[first:last], docs))
+        blocks = blocks[blocks < last]
+        if not len(blocks):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+        gaps = varint_decode(np.concatenate(
+            [self.doc_gaps[self.block_doc_offsets[b]:self.block_doc_offsets[b + 1]] for b in blocks.tolist()]))
+        tfs = varint_decode(np.concatenate(
+            [self.tfs[self.block_tf_offsets[b]:self.block_tf_offsets[b + 1]] for b in blocks.tolist()]))
+
+        # gaps restart from the previous block's last doc id, which may not have been decoded
+        df = self.df[term_id]
+        counts = np.minimum(POSTINGS_BLOCK, df - (blocks - first) * POSTINGS_BLOCK)
+        base = np.where(blocks > first, self.block_last[np.maximum(blocks - 1, 0)], 0)
+        sums = np.cumsum(gaps.astype(np.int64))
+        starts = np.cumsum(counts) - counts
+        block_of = np.repeat(np.arange(len(blocks)), counts)
+        return sums - (sums[starts] - gaps[starts].astype(np.int64) - base)[block_of], tfs
+
+    def term_ids(self, query):
+        """Ids of the distinct indexed terms of `query`."""
+        return list(dict.fromkeys(self.vocab[t] for t in tokenize(query, self.stopwords) if t in self.vocab))
+
+    def score_all(self, query):
+        """Exhaustive BM25: `(doc_ids, scores)` of every document matching `query`, by doc id."""
+        docs, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for term_id in self.term_ids(query):
+            term_docs, tfs = self.postings(term_id)
+            docs, scores = _merge(docs, scores, term_docs, self._scores(term_id, term_docs, tfs))
+        return docs, scores
+
+    def search(self, query, k=10):
+        """Top `k` documents for `query`: `(ids, scores)`, best first."""
+        if k < 1:
+            raise ValueError(f"k must be positive, got {k}")
+        terms = self.term_ids(query)
+        terms.sort(key=lambda t: -self.max_scores[t])
+        # remaining[i]: the most that terms i.. can still add to any document
+        remaining = np.cumsum(self.max_scores[terms][::-1])[::-1].tolist() + [0.0]
+
+        docs, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for i, term_id in enumerate(terms):
+            theta = np.partition(scores, len(scores) - k)[len(scores) - k] if len(scores) >= k else 0.0
+            if remaining[i] <= theta:
+                # a document matching none of the terms so far can no longer reach the top-k:
+                # drop hopeless candidates, then score only the survivors against this term
+                keep = scores + remaining[i] >= theta
+                docs, scores = docs[keep], scores[keep]
+                term_docs, tfs = self._postings_for(term_id, docs)
+                pos = np.minimum(np.searchsorted(docs, term_docs), len(docs) - 1)
+                hit = docs[pos] == term_docs
+                scores[pos[hit]] += self._scores(term_id, term_docs[hit], tfs[hit])
+            else:
+                term_docs, tfs = self.postings(term_id)
+                docs, scores = _merge(docs, scores, term_docs, self._scores(term_id, term_docs, tfs))
+
+        order = np.lexsort((docs, -scores))[:k]
+        return docs[order], scores[order]
+
+
+def _merge(docs_a, scores_a, docs_b, scores_b):
+    """Sum two sparse score vectors given as sorted doc ids and scores."""
+    docs = np.union1d(docs_a, docs_b)
+    scores = np.zeros(len(docs), dtype=np.float32)
+    scores[np.searchsorted(docs, docs_a)] += scores_a
+    scores[np.searchsorted(docs, docs_b)] += scores_b
+    return docs, scores
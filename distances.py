@@ -0,0 +1,136 @@
+"""Vectorized distance matrices for embeddings.
+
+All four metrics from the embeddings lesson (L1, L2, dot product and cosine)
+computed for a whole (Q, d) query matrix against an (N, d) corpus at once.
+The corpus is processed in row blocks so memory stays bounded, and L2 / dot /
+cosine are expressed as one matrix multiply per block so the work runs in BLAS.
+"""
+
+import numpy as np
+
+METRICS = ("l1", "l2", "dot", "cosine")
+
+# rows of the corpus scored per block; 4096 x 768 float32 is ~12MB
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def as_matrix(x, dtype=np.float32):
+    """Return `x` as a C-contiguous 2D array of `dtype` (a single vector becomes one row)."""
+    x = np.asarray(x, dtype=dtype)
+    if x.ndim == 1:
+        x = x[None, :]
+    return np.ascontiguousarray(x)
+
+
+def row_norms(x, squared=False):
+    """L2 norm of every row of `x`."""
+    sq = np.einsum("ij,ij->i", x, x)
+    return sq if squared else np.sqrt(sq)
+
+
+def normalize(x, dtype=np.float32):
+    """L2 normalize the rows of `x`; all-zero rows are left as zeros."""
+    x = as_matrix(x, dtype)
+    norms = row_norms(x)
+    norms[norms == 0] = 1
+    return x / norms[:, None]
+
+
+def is_similarity(metric):
+    """True when larger values mean closer (dot product), False for distances."""
+    return metric == "dot"
+
+
+class Corpus:
+    """A corpus matrix with its row norms precomputed once.
+
+    Pass one of these instead of a raw array when the same corpus is scored
+    against many query batches, so the norms are not recomputed each time.
+    """
+
+    def __init__(self, vectors, dtype=np.float32):
+        self.vectors = as_matrix(vectors, dtype)
+        self.sq_norms = row_norms(self.vectors, squared=True)
+        self.norms = np.sqrt(self.sq_norms)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+
+def _block_scores(q, q_sq, q_norms, block, b_sq, b_norms, metric):
+    if metric == "l1":
+        return np.abs(q[:, None, :] - block[None, :, :]).sum(-1)
+
+    dots = q @ block.T
+    if metric == "dot":
+        return dots
+    if metric == "l2":
+        d2 = q_sq[:, None] + b_sq[None, :] - 2 * dots
+        np.maximum(d2, 0, out=d2)  # clip tiny negatives from rounding
+        return np.sqrt(d2, out=d2)
+    # cosine
+    denom = q_norms[:, None] * b_norms[None, :]
+    denom[denom == 0] = 1
+    return 1 - dots / denom
+
+
+def iter_distance_blocks(queries, corpus, metric="cosine", block_size=DEFAULT_BLOCK_SIZE, dtype=np.float32):
+    """Yield `(start, scores)` for consecutive corpus row blocks.
+
+    `scores` has shape (Q, block) and holds distances for "l1", "l2" and
+    "cosine", or similarities for "dot". `corpus` may be an array or a
+    `Corpus` with precomputed norms.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric!r}, expected one of {METRICS}")
+    if not isinstance(corpus, Corpus):
+        corpus = Corpus(corpus, dtype)
+    q = as_matrix(queries, corpus.vectors.dtype)
+    if q.shape[1] != corpus.dim:
+        raise ValueError(f"query dim {q.shape[1]} does not match corpus dim {corpus.dim}")
+
+    q_sq = row_norms(q, squared=True)
+    q_norms = np.sqrt(q_sq)
+
+    # L1 broadcasts a (Q, block, d) temporary, so shrink the block to match
+    if metric == "l1":
+        block_size = max(1, min(block_size, (1 << 24) // max(1, q.shape[0] * corpus.dim)))
+
+    for start in range(0, len(corpus), block_size):
+        stop = start + block_size
+        yield start, _block_scores(
+            q, q_sq, q_norms,
+            corpus.vectors[start:stop], corpus.sq_norms[start:stop], corpus.norms[start:stop],
+            metric,
+        )
+
+
+def distance_matrix(queries, corpus, metric="cosine", block_size=DEFAULT_BLOCK_SIZE, dtype=np.float32):
+    """Full (Q, N) matrix of distances (or dot-product similarities) between queries and corpus."""
+    if not isinstance(corpus, Corpus):
+        corpus = Corpus(corpus, dtype)
+    q = as_matrix(queries, dtype)
+    out = np.empty((q.shape[0], len(corpus)), dtype=dtype)
+    for start, scores in iter_distance_blocks(q, corpus, metric, block_size, dtype):
+        out[:, start:start + scores.shape[1]] = scores
+    return out
+
+
+def l1_distance(queries, corpus, **kwargs):
+    return distance_matrix(queries, corpus, "l1", **kwargs)
+
+
+def l2_distance(queries, corpus, **kwargs):
+    return distance_matrix(queries, corpus, "l2", **kwargs)
+
+
+def dot_product(queries, corpus, **kwargs):
+    return distance_matrix(queries, corpus, "dot", **kwargs)
+
+
+def cosine_distance(queries, corpus, **kwargs):
+    return distance_matrix(queries, corpus, "cosine", **kwargs)
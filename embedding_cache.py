@@ -0,0 +1,165 @@
+"""Persistent cache of text embeddings, keyed by model name and text hash.
+
+Each model gets its own directory holding the embeddings in a memory-mapped
+`VectorStore` (`vectors.vecs`) plus an index file (`index.npz`) mapping the
+blake2b hash of every cached text to its row and last-use tick. Looking up a
+batch of texts only hashes them; the misses are de-duplicated and sent to the
+model in a single call. Once `max_entries` rows are in use, the least
+recently used rows are overwritten in place.
+
+    cache = EmbeddingCache(".embedding_cache", "paraphrase-MiniLM-L6-v2")
+    embedding = cache.encode(sentences, model.encode)
+"""
+
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from vector_store import VectorStore
+
+DEFAULT_CACHE_DIR = ".embedding_cache"
+
+
+def text_key(text):
+    """16 byte blake2b digest of `text`."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, model_name="default", max_entries=1_000_000,
+                 dtype=np.float32):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self._store_path = os.path.join(self.path, "vectors.vecs")
+        self._index_path = os.path.join(self.path, "index.npz")
+
+        self.store = VectorStore(self._store_path, mode="r+") if os.path.exists(self._store_path) else None
+        # keys[slot] is the text hash stored in that row, b"" for a row without one
+        self.keys, self.last_used, self.clock = [], np.zeros(0, dtype=np.uint64), 0
+        if self.store is not None and os.path.exists(self._index_path):
+            with np.load(self._index_path) as index:
+                self.keys = [bytes(k) if k.any() else b"" for k in index["keys"][:len(self.store)]]
+                self.last_used = index["last_used"][:len(self.store)].copy()
+                self.clock = int(index["clock"])
+        if self.store is not None and len(self.keys) < len(self.store):
+            # rows appended after the last flush have no index entry; treat them as free
+            missing = len(self.store) - len(self.keys)
+            self.keys += [b""] * missing
+            self.last_used = np.concatenate([self.last_used, np.zeros(missing, dtype=np.uint64)])
+        self.slots = {key: slot for slot, key in enumerate(self.keys) if key}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, text):
+        return text_key(text) in self.slots
+
+    def _tick(self, slots):
+        self.clock += 1
+        self.last_used[slots] = self.clock
+
+    def lookup(self, texts):
+        """`(slots, keys)` for `texts`; slot is -1 for a miss."""
+        keys = [text_key(t) for t in texts]
+        slots = np.array([self.slots.get(k, -1) for k in keys], dtype=np.int64)
+        return slots, keys
+
+    def _allocate(self, n, protected):
+        """Rows for `n` new entries: unused capacity first, then least recently used rows not in `protected`."""
+        used = len(self.keys)
+        fresh = min(n, self.max_entries - used)
+        slots = list(range(used, used + max(fresh, 0)))
+        if len(slots) < n:
+            age = self.last_used.astype(np.float64)
+            age[protected] = np.inf
+            need = n - len(slots)
+            if need > np.isfinite(age).sum():
+                raise ValueError(f"batch needs {n} new entries but the cache holds at most {self.max_entries}")
+            evict = np.argpartition(age, need - 1)[:need]
+            for slot in evict.tolist():
+                self.slots.pop(self.keys[slot], None)
+            slots += evict.tolist()
+        return slots
+
+    def put(self, keys, vectors, protected=()):
+        """Store `vectors` under `keys`, never evicting the rows in `protected`; returns their rows."""
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        if self.store is None:
+            self.store = VectorStore.create(self._store_path, vectors.shape[1], self.dtype)
+        slots = self._allocate(len(keys), np.asarray(protected, dtype=np.int64))
+
+        fresh = [i for i, slot in enumerate(slots) if slot >= len(self.keys)]
+        reused = [i for i, slot in enumerate(slots) if slot < len(self.keys)]
+        if reused:
+            self.store.vectors[np.array(slots)[reused]] = vectors[reused]
+        if fresh:
+            self.store.append(vectors[fresh])
+            self.keys.extend([b""] * len(fresh))
+            self.last_used = np.concatenate([self.last_used, np.zeros(len(fresh), dtype=np.uint64)])
+        for key, slot in zip(keys, slots):
+            self.keys[slot] = key
+            self.slots[key] = slot
+        self._tick(slots)
+        return slots
+
+    def encode(self, texts, encode_fn):
+        """Embeddings for `texts` as an (n, dim) array, calling `encode_fn` only for the misses.
+
+        `encode_fn` takes a list of texts and returns their embeddings, e.g.
+        `model.encode`. Misses are de-duplicated and encoded in one call.
+        When there are more misses than the cache can hold next to this
+        call's hits, all of them are still returned but only the first ones
+        are cached.
+        """
+        texts = list(texts)
+        slots, keys = self.lookup(texts)
+        hits = slots >= 0
+        if hits.any():
+            self._tick(slots[hits])
+
+        missing = {}
+        for i in np.flatnonzero(~hits).tolist():
+            missing.setdefault(keys[i], i)
+        if not missing:
+            if self.store is None:
+                return np.empty((0, 0), dtype=self.dtype)
+            return np.array(self.store.vectors[slots])
+
+        vectors = np.asarray(encode_fn([texts[i] for i in missing.values()]), dtype=self.dtype)
+        out = np.empty((len(texts), vectors.shape[1]), dtype=self.dtype)
+        if hits.any():
+            out[hits] = self.store.vectors[slots[hits]]
+        row = {key: j for j, key in enumerate(missing)}
+        out[~hits] = vectors[[row[keys[i]] for i in np.flatnonzero(~hits).tolist()]]
+
+        # cache as many misses as fit without evicting this call's hits
+        protected = np.unique(slots[hits])
+        room = max(self.max_entries - len(protected), 0)
+        if room:
+            self.put(list(missing)[:room], vectors[:room], protected=protected)
+        return out
+
+    def flush(self):
+        """Write the vectors and the index to disk."""
+        if self.store is None:
+            return
+        self.store.flush()
+        tmp = self._index_path + ".tmp.npz"
+        keys = np.zeros((len(self.keys), 16), dtype=np.uint8)
+        for slot, key in enumerate(self.keys):
+            if key:
+                keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        np.savez(tmp, keys=keys, last_used=self.last_used,
+                 clock=np.uint64(self.clock))
+        os.replace(tmp, self._index_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
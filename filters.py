@@ -0,0 +1,151 @@
+"""Pre-filtered vector search over scalar properties.
+
+`PropertyIndex` keeps inverted indexes over the scalar properties of the
+objects in a vector index: a posting array of ids per value for text and
+booleans, and a sorted copy of the values for numbers. Weaviate-style
+`where` filters, like the ones passed to `.with_where(...)` in the lessons,
+are evaluated against it into a numpy boolean bitmap of allowed ids.
+
+`FilteredSearch` then uses that bitmap before the vector search rather than
+post-filtering its results: a selective filter is answered by an exact scan
+of the allowed ids only, anything broader by HNSW traversal that never
+returns a disallowed id. Either way up to `limit` hits come back.
+
+    where = {"path": ["foo"], "operator": "GreaterThan", "valueNumber": 44}
+    ids, distances = FilteredSearch(index, {"foo": foo}).search(query, 2, where)
+"""
+
+import numpy as np
+
+import knn
+
+VALUE_KEYS = ("valueNumber", "valueInt", "valueText", "valueString", "valueBoolean")
+
+# `where` operators and the (side, include_equal) of the sorted range they select
+_RANGES = {
+    "GreaterThan": ("right", False),
+    "GreaterThanEqual": ("right", True),
+    "LessThan": ("left", False),
+    "LessThanEqual": ("left", True),
+}
+
+
+class _Column:
+    def __init__(self, values):
+        values = np.asarray(values)
+        self.numeric = values.dtype.kind in "iuf"
+        if self.numeric:
+            self.order = np.argsort(values, kind="stable")
+            self.sorted = values[self.order]
+        else:
+            self.postings = {}
+            for i, value in enumerate(values.tolist()):
+                self.postings.setdefault(value, []).append(i)
+            self.postings = {v: np.array(ids, dtype=np.int64) for v, ids in self.postings.items()}
+
+    def ids(self, operator, value):
+        """Ids whose value satisfies `operator value`."""
+        if not self.numeric:
+            if operator == "Equal":
+                return self.postings.get(value, np.empty(0, dtype=np.int64))
+            if operator == "NotEqual":
+                others = [ids for v, ids in self.postings.items() if v != value]
+                return np.concatenate(others) if others else np.empty(0, dtype=np.int64)
+            raise ValueError(f"operator {operator!r} is not supported on text properties")
+
+        lo = np.searchsorted(self.sorted, value, "left")
+        hi = np.searchsorted(self.sorted, value, "right")
+        if operator == "Equal":
+            return self.order[lo:hi]
+        if operator == "NotEqual":
+            return np.concatenate([self.order[:lo], self.order[hi:]])
+        if operator not in _RANGES:
+            raise ValueError(f"unsupported operator {operator!r}")
+        side, include_equal = _RANGES[operator]
+        if side == "right":
+            return self.order[lo if include_equal else hi:]
+        return self.order[:hi if include_equal else lo]
+
+
+class PropertyIndex:
+    """Inverted indexes over scalar properties, one column per property name."""
+
+    def __init__(self, properties):
+        lengths = {len(v) for v in properties.values()}
+        if len(lengths) > 1:
+            raise ValueError("all properties must have one value per object")
+        self.count = lengths.pop() if lengths else 0
+        self.properties = {name: list(values) for name, values in properties.items()}
+        self._columns = {}
+
+    def extend(self, properties):
+        """Append the properties of newly added objects (same names, one value each)."""
+        for name, values in self.properties.items():
+            values.extend(properties[name])
+        self.count = len(next(iter(self.properties.values()), []))
+        self._columns = {}
+
+    def _column(self, name):
+        if name not in self._columns:
+            if name not in self.properties:
+                raise KeyError(f"no property {name!r} is indexed")
+            self._columns[name] = _Column(self.properties[name])
+        return self._columns[name]
+
+    def mask(self, where):
+        """Evaluate a Weaviate-style `where` filter into a boolean array over ids."""
+        operator = where["operator"]
+        if operator in ("And", "Or"):
+            masks = [self.mask(operand) for operand in where["operands"]]
+            combine = np.logical_and if operator == "And" else np.logical_or
+            return combine.reduce(masks) if masks else np.ones(self.count, dtype=bool)
+
+        value_keys = [key for key in VALUE_KEYS if key in where]
+        if len(value_keys) != 1:
+            raise ValueError(f"filter needs exactly one of {VALUE_KEYS}: {where}")
+        (name,) = where["path"]
+        out = np.zeros(self.count, dtype=bool)
+        out[self._column(name).ids(operator, where[value_keys[0]])] = True
+        return out
+
+
+class FilteredSearch:
+    """Vector search restricted to the objects matching a `where` filter.
+
+    When at most `brute_force_below` of the live objects pass the filter, the
+    allowed vectors are scanned exactly, which is cheap and never misses;
+    otherwise HNSW is traversed with the filter bitmap so only allowed ids are
+    collected. `last_strategy` records which path the previous query took.
+    """
+
+    def __init__(self, index, properties, brute_force_below=0.05):
+        self.index = index
+        self.properties = properties if isinstance(properties, PropertyIndex) else PropertyIndex(properties)
+        self.brute_force_below = brute_force_below
+        self.last_strategy = None
+
+    def allowed(self, where):
+        mask = self.properties.mask(where)[:self.index.count]
+        return mask & ~self.index.deleted[:self.index.count]
+
+    def search(self, query, k, where=None, ef_search=None):
+        """`(ids, distances)` of the `k` nearest objects passing `where`, closest first."""
+        if where is None:
+            self.last_strategy = "hnsw"
+            return self.index.search(query, k, ef_search)
+
+        allowed = self.allowed(where)
+        n_allowed = int(allowed.sum())
+        if n_allowed <= max(k, self.brute_force_below * len(self.index)):
+            self.last_strategy = "brute_force"
+            return self._scan(query, k, np.flatnonzero(allowed))
+
+        self.last_strategy = "hnsw"
+        return self.index.search(query, k, ef_search, allowed=allowed)
+
+    def _scan(self, query, k, ids):
+        if not len(ids):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = self.index.prepare(query)
+        pos, dists = knn.search(q, self.index.vectors[ids], k, self.index.metric)
+        return ids[pos[0]], dists[0]
@@ -0,0 +1,698 @@
+"""Array-backed HNSW (Hierarchical Navigable Small World) index.
+
+Vectors live in one contiguous float32 matrix and every layer's adjacency is
+a fixed-width int32 array (`-1` marks an empty slot): `2*M` neighbours per
+node on layer 0 and `M` on the layers above. Search is the usual heap-based
+beam search, controlled by `ef_construction` while building and `ef_search`
+while querying.
+
+Nodes can be added, updated and deleted online. Deletes are tombstones:
+the node stays in the graph for navigation but is never returned, and once
+tombstones exceed `compaction_threshold` of the live nodes a background
+`compact` relinks their neighbours around them and drops them from the graph.
+
+`save` writes the index to one binary file and `load` memory-maps it back,
+so a saved index is queryable without a deserialization pass.
+
+`to_networkx` and `search_graphs` turn the index back into the per-layer
+`nx.Graph` lists used by the plots in the approximate nearest neighbours lesson.
+"""
+
+import heapq
+import math
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from distances import as_matrix, normalize
+from knn import topk
+
+METRICS = ("l2", "cosine")
+
+# neighbour rows are guarded by striped locks (node % N_LOCKS) during
+# concurrent construction, rather than one lock per node
+N_LOCKS = 1024
+
+# on-disk format: a fixed header, then vectors (count, dim) float32, levels
+# (count,) int32, tombstones (count,) bool and one (count, width) int32 neighbour array per layer, each
+# section starting on a 64 byte boundary
+MAGIC = b"HNSW"
+VERSION = 2
+HEADER_SIZE = 128
+_HEADER = struct.Struct("<4sI8sQQQQQqqQ")
+_ALIGN = 64
+
+# index being built, inherited by forked workers in `add_bulk(use_processes=True)`
+_worker_index = None
+
+
+def _grow_rows(a, rows, fill):
+    grown = np.full((rows,) + a.shape[1:], fill, dtype=a.dtype)
+    grown[:len(a)] = a
+    return grown
+
+
+class HNSW:
+    def __init__(self, dim, M=16, ef_construction=200, ef_search=50, metric="l2", capacity=1024, seed=None,
+                 compaction_threshold=0.2, background_compaction=True):
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric!r}, expected one of {METRICS}")
+        self.dim = dim
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.metric = metric
+        self.level_mult = 1 / math.log(max(M, 2))
+        self.rng = np.random.default_rng(seed)
+        self.compaction_threshold = compaction_threshold
+        self.background_compaction = background_compaction
+
+        self.count = 0
+        self.entry_point = -1
+        self.max_level = -1
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        # level of each node; -1 once a deleted node has been compacted out of the graph
+        self.levels = np.zeros(capacity, dtype=np.int32)
+        self.deleted = np.zeros(capacity, dtype=bool)
+        self.n_deleted = 0
+        self.n_tombstones = 0  # deleted but still linked into the graph
+        # neighbours[layer] is a (capacity, width) int32 array, -1 padded
+        self.neighbours = []
+        self._local = threading.local()
+        self._locks = [threading.Lock() for _ in range(N_LOCKS)]
+        # serializes add / update / delete / compact; searches never take it
+        self._write_lock = threading.RLock()
+        self._compaction = None
+
+    def __len__(self):
+        return self.count - self.n_deleted
+
+    @property
+    def nbytes(self):
+        """Bytes held by the vectors, levels and neighbour arrays (allocated capacity)."""
+        return self.vectors.nbytes + self.levels.nbytes + self.deleted.nbytes + sum(adj.nbytes for adj in self.neighbours)
+
+    # -- storage ---------------------------------------------------------
+
+    def _width(self, layer):
+        return self.M0 if layer == 0 else self.M
+
+    def _reserve(self, needed):
+        capacity = len(self.vectors)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+        self.vectors = _grow_rows(self.vectors, capacity, 0)
+        self.levels = _grow_rows(self.levels, capacity, 0)
+        self.deleted = _grow_rows(self.deleted, capacity, False)
+        for layer, adj in enumerate(self.neighbours):
+            self.neighbours[layer] = _grow_rows(adj, capacity, -1)
+
+    def _ensure_layers(self, level):
+        while len(self.neighbours) <= level:
+            width = self._width(len(self.neighbours))
+            self.neighbours.append(np.full((len(self.vectors), width), -1, dtype=np.int32))
+
+    def _random_level(self):
+        return int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+
+    def prepare(self, vectors):
+        """`vectors` as the float32 rows this index stores (L2 normalized for cosine)."""
+        if self.metric == "cosine":
+            return normalize(vectors)
+        return as_matrix(vectors)
+
+    # -- distances -------------------------------------------------------
+
+    def _distances(self, q, ids):
+        """Distances from the single vector `q` to the stored rows `ids`."""
+        v = self.vectors[ids]
+        if self.metric == "l2":
+            diff = v - q
+            return np.einsum("ij,ij->i", diff, diff)  # squared; same ordering
+        return 1 - v @ q
+
+    def neighbours_of(self, node, layer):
+        row = self.neighbours[layer][node]
+        return row[row >= 0]
+
+    def _visit_marker(self):
+        # per-thread visited stamps so concurrent searches don't share state
+        local = self._local
+        if getattr(local, "visited", None) is None or len(local.visited) < len(self.vectors):
+            local.visited = np.zeros(len(self.vectors), dtype=np.uint32)
+            local.tag = 0
+        local.tag += 1
+        if local.tag == np.iinfo(np.uint32).max:
+            local.visited[:] = 0
+            local.tag = 1
+        return local.visited, local.tag
+
+    # -- search ----------------------------------------------------------
+
+    def _search_layer(self, q, entry_points, ef, layer, exclude=None):
+        """Beam search on one layer; returns up to `ef` `(distance, node)` pairs, closest first.
+
+        Nodes flagged in the boolean array `exclude` are still traversed, so
+        the graph stays navigable, but are never returned.
+        """
+        visited, tag = self._visit_marker()
+        entry_points = np.asarray(entry_points, dtype=np.int64)
+        visited[entry_points] = tag
+
+        dists = self._distances(q, entry_points).tolist()
+        candidates = list(zip(dists, entry_points.tolist()))
+        heapq.heapify(candidates)
+        results = [(-d, n) for d, n in candidates if exclude is None or not exclude[n]]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            dist, node = heapq.heappop(candidates)
+            if len(results) >= ef and dist > -results[0][0]:
+                break
+            nbrs = self.neighbours_of(node, layer)
+            nbrs = nbrs[visited[nbrs] != tag]
+            if not len(nbrs):
+                continue
+            visited[nbrs] = tag
+            for d, n in zip(self._distances(q, nbrs).tolist(), nbrs.tolist()):
+                if len(results) < ef or d < -results[0][0]:
+                    heapq.heappush(candidates, (d, n))
+                    if exclude is not None and exclude[n]:
+                        continue
+                    heapq.heappush(results, (-d, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted((-d, n) for d, n in results)
+
+    def _tombstones(self):
+        return self.deleted if self.n_tombstones else None
+
+    def _descend(self, q, level):
+        """Greedy search from the entry point down to (but not including) `level`."""
+        ep = self.entry_point
+        for layer in range(self.max_level, level, -1):
+            ep = self._search_layer(q, [ep], 1, layer)[0][1]
+        return ep
+
+    def search(self, query, k, ef_search=None, allowed=None):
+        """Approximate `k` nearest neighbours of one query: `(ids, distances)`, closest first.
+
+        `allowed` is an optional boolean array over node ids; only nodes set
+        in it are returned, while the rest are still used to navigate.
+        """
+        if self.entry_point < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = self.prepare(query)[0]
+        ef = max(ef_search or self.ef_search, k)
+        exclude = self._tombstones()
+        if allowed is not None:
+            exclude = ~allowed[:self.count] if exclude is None else exclude[:self.count] | ~allowed[:self.count]
+        found = self._search_layer(q, [self._descend(q, 0)], ef, 0, exclude)[:k]
+        return self._result(found)
+
+    def search_batch(self, queries, k, ef_search=None, allowed=None):
+        """`search` for every row of `queries`; (Q, k) arrays padded with -1 / inf."""
+        queries = as_matrix(queries)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        dists = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, q in enumerate(queries):
+            found_ids, found_dists = self.search(q, k, ef_search, allowed)
+            ids[i, :len(found_ids)] = found_ids
+            dists[i, :len(found_dists)] = found_dists
+        return ids, dists
+
+    def _result(self, found):
+        ids = np.array([n for _, n in found], dtype=np.int64)
+        dists = np.array([d for d, _ in found], dtype=np.float32)
+        if self.metric == "l2":
+            dists = np.sqrt(np.maximum(dists, 0))
+        return ids, dists
+
+    # -- construction ----------------------------------------------------
+
+    def _select_neighbours(self, candidates, m):
+        """Neighbour selection heuristic from the HNSW paper.
+
+        `candidates` are `(distance, node)` pairs sorted closest first. A
+        candidate is kept only if it is closer to the base node than to any
+        neighbour already kept, which spreads links in different directions;
+        remaining slots are then filled with the closest pruned candidates.
+        """
+        if len(candidates) <= m:
+            return [n for _, n in candidates]
+        selected = []
+        pruned = []
+        for dist, node in candidates:
+            if len(selected) >= m:
+                break
+            if selected and (self._distances(self.vectors[node], selected) < dist).any():
+                pruned.append(node)
+                continue
+            selected.append(node)
+        for node in pruned:
+            if len(selected) >= m:
+                break
+            selected.append(node)
+        return selected
+
+    def _set_neighbours(self, node, layer, nbrs):
+        new_row = np.full(self._width(layer), -1, dtype=np.int32)
+        new_row[:len(nbrs)] = nbrs
+        # one assignment, so lock-free readers never see a half-cleared row
+        self.neighbours[layer][node] = new_row
+
+    def _lock(self, node):
+        return self._locks[node % N_LOCKS]
+
+    def _sorted_candidates(self, node, ids):
+        ids = np.asarray(ids)
+        d = self._distances(self.vectors[node], ids)
+        order = np.argsort(d, kind="stable")
+        return list(zip(d[order].tolist(), ids[order].tolist()))
+
+    def _link(self, node, new, layer):
+        """Add the edge node -> new, re-selecting node's neighbours if its row is full."""
+        with self._lock(node):
+            row = self.neighbours[layer][node]
+            if (row == new).any():
+                return
+            free = np.flatnonzero(row < 0)
+            if len(free):
+                row[free[0]] = new
+                return
+            keep = self._select_neighbours(self._sorted_candidates(node, np.append(row, new)), len(row))
+            self._set_neighbours(node, layer, keep)
+
+    def _connect(self, node, layer, candidates):
+        with self._lock(node):
+            existing = self.neighbours_of(node, layer)
+            if len(existing):
+                # another insert already linked to this node; keep those edges in the running
+                ids = {n for _, n in candidates} | set(existing.tolist())
+                candidates = self._sorted_candidates(node, sorted(ids))
+            nbrs = self._select_neighbours(candidates, self.M)
+            self._set_neighbours(node, layer, nbrs)
+        for n in nbrs:
+            self._link(n, node, layer)
+
+    def _insert(self, node):
+        q = self.vectors[node]
+        level = int(self.levels[node])
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        ep = [self._descend(q, level)]
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(q, ep, self.ef_construction, layer, self._tombstones())
+            if not candidates:
+                # everything reachable is a tombstone; link to them rather than nothing
+                candidates = self._search_layer(q, ep, self.ef_construction, layer)
+            self._connect(node, layer, candidates)
+            ep = [n for _, n in candidates]
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def _stage(self, vectors):
+        """Copy `vectors` into storage and draw their levels; returns the new ids."""
+        vectors = self.prepare(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"expected vectors of dim {self.dim}, got {vectors.shape[1]}")
+        start, stop = self.count, self.count + len(vectors)
+        self._reserve(stop)
+        self.vectors[start:stop] = vectors
+        levels = [self._random_level() for _ in range(len(vectors))]
+        self.levels[start:stop] = levels
+        self.deleted[start:stop] = False
+        self._ensure_layers(max(levels, default=0))
+        return np.arange(start, stop)
+
+    def add(self, vectors):
+        """Insert the rows of `vectors` one at a time; returns their ids."""
+        with self._write_lock:
+            self._check_writable()
+            ids = self._stage(vectors)
+            for node in ids.tolist():
+                self.count = node + 1
+                self._insert(node)
+            return ids
+
+    def _graph_candidates(self, node):
+        """Construction candidates for `node` per layer, found by searching the current graph."""
+        q = self.vectors[node]
+        level = int(self.levels[node])
+        ep = [self._descend(q, level)]
+        found = {}
+        for layer in range(min(level, self.max_level), -1, -1):
+            found[layer] = self._search_layer(q, ep, self.ef_construction, layer, self._tombstones())
+            ep = [n for _, n in found[layer]]
+        return found
+
+    def _batch_candidates(self, batch):
+        """Closest other members of `batch` for each member, from one distance matrix."""
+        v = self.vectors[batch]
+        if self.metric == "l2":
+            sq = np.einsum("ij,ij->i", v, v)
+            d = sq[:, None] + sq[None, :] - 2 * (v @ v.T)
+        else:
+            d = 1 - v @ v.T
+        np.fill_diagonal(d, np.inf)
+        # at most len(batch) - 1 others, so the diagonal is never selected
+        pos, dists = topk(d, min(self.ef_construction, len(batch) - 1), largest=False)
+        return batch[pos], dists
+
+    def _map_graph_candidates(self, batch, n_workers, use_processes):
+        if use_processes and "fork" in multiprocessing.get_all_start_methods():
+            global _worker_index
+            _worker_index = self
+            try:
+                with multiprocessing.get_context("fork").Pool(n_workers) as pool:
+                    chunks = [c.tolist() for c in np.array_split(batch, n_workers) if len(c)]
+                    return [found for chunk in pool.map(_graph_candidates_worker, chunks) for found in chunk]
+            finally:
+                _worker_index = None
+        with ThreadPoolExecutor(n_workers) as executor:
+            return list(executor.map(self._graph_candidates, batch.tolist()))
+
+    def add_bulk(self, vectors, batch_size=1024, n_workers=None, use_processes=False):
+        """Insert many vectors a batch at a time; returns their ids.
+
+        For each batch, every new node searches the graph as it stood before
+        the batch, on a pool of `n_workers`. Nodes of the same batch cannot
+        find each other that way, so their mutual candidates come from one
+        vectorized (batch x batch) distance matrix instead. The two candidate
+        lists are merged and the new nodes are linked concurrently, with
+        striped locks guarding the neighbour rows.
+
+        Threads share the graph directly; `use_processes=True` runs the
+        searches in forked workers instead (the graph is inherited copy on
+        write), which sidesteps the GIL but forks once per batch, so use large
+        batches with it. Linking always happens in this process.
+        """
+        with self._write_lock:
+            self._check_writable()
+            ids = self._stage(vectors)
+            n_workers = n_workers or os.cpu_count() or 1
+            todo = ids
+            if self.entry_point < 0 and len(todo):
+                self.count = int(todo[0]) + 1
+                self._insert(int(todo[0]))
+                todo = todo[1:]
+
+            for b in range(0, len(todo), batch_size):
+                batch = todo[b:b + batch_size]
+                self.count = int(batch[-1]) + 1
+                graph_found = self._map_graph_candidates(batch, n_workers, use_processes)
+                batch_ids, batch_dists = self._batch_candidates(batch)
+                levels = self.levels
+
+                def connect(i):
+                    node = int(batch[i])
+                    for layer in range(int(levels[node]), -1, -1):
+                        on_layer = levels[batch_ids[i]] >= layer
+                        merged = dict((n, d) for d, n in graph_found[i].get(layer, []))
+                        merged.update(zip(batch_ids[i][on_layer].tolist(), batch_dists[i][on_layer].tolist()))
+                        candidates = sorted((d, n) for n, d in merged.items())[:self.ef_construction]
+                        self._connect(node, layer, candidates)
+
+                if use_processes:
+                    for i in range(len(batch)):
+                        connect(i)
+                else:
+                    with ThreadPoolExecutor(n_workers) as executor:
+                        list(executor.map(connect, range(len(batch))))
+
+                top = int(batch[levels[batch].argmax()])
+                if levels[top] > self.max_level:
+                    self.entry_point, self.max_level = top, int(levels[top])
+            return ids
+
+    @classmethod
+    def build(cls, vectors, n_workers=1, batch_size=1024, **kwargs):
+        """Build an index over `vectors`; `n_workers > 1` uses `add_bulk`."""
+        vectors = as_matrix(vectors)
+        kwargs.setdefault("capacity", max(1, len(vectors)))
+        index = cls(vectors.shape[1], **kwargs)
+        if n_workers > 1:
+            index.add_bulk(vectors, batch_size, n_workers)
+        else:
+            index.add(vectors)
+        return index
+
+    # -- updates and deletes ---------------------------------------------
+
+    def _check_writable(self):
+        arrays = [self.vectors, self.levels, self.deleted, *self.neighbours]
+        if not all(a.flags.writeable for a in arrays):
+            raise ValueError("this index is memory-mapped read-only; load it with mmap_mode=\"c\" "
+                             "(copy on write) or \"r+\" to modify it")
+
+    def _check_ids(self, ids):
+        self._check_writable()
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        bad = (ids < 0) | (ids >= self.count)
+        bad[~bad] = self.deleted[ids[~bad]]
+        if bad.any():
+            raise KeyError(f"no live node with id {int(ids[bad][0])}")
+        return ids
+
+    def _relink(self, node, layer, extra=()):
+        """Re-select `node`'s neighbours on `layer` from its current ones plus `extra`, minus tombstones."""
+        with self._lock(node):
+            ids = set(self.neighbours_of(node, layer).tolist()) | set(extra)
+            ids.discard(node)
+            ids = [n for n in sorted(ids) if not self.deleted[n]]
+            width = self._width(layer)
+            keep = self._select_neighbours(self._sorted_candidates(node, ids), width) if ids else []
+            self._set_neighbours(node, layer, keep)
+
+    def update(self, ids, vectors):
+        """Replace the vectors of existing nodes and repair the links around them."""
+        with self._write_lock:
+            ids = self._check_ids(ids)
+            self.vectors[ids] = self.prepare(vectors)
+            tombstones = self.deleted.copy()
+            for node in ids.tolist():
+                q = self.vectors[node]
+                level = int(self.levels[node])
+                tombstones[node] = True  # don't pick itself as a neighbour
+                ep = [self._descend(q, level)]
+                for layer in range(level, -1, -1):
+                    old = self.neighbours_of(node, layer).tolist()
+                    candidates = self._search_layer(q, ep, self.ef_construction, layer, tombstones)
+                    ep = [n for _, n in candidates] or ep
+                    self._set_neighbours(node, layer, [])
+                    self._connect(node, layer, candidates)
+                    # the old neighbours may now hold a long edge to it
+                    for n in old:
+                        if not self.deleted[n]:
+                            self._relink(n, layer, old)
+                tombstones[node] = self.deleted[node]
+
+    def delete(self, ids):
+        """Tombstone nodes so searches skip them.
+
+        Their links stay in place, so the graph remains navigable. Once the
+        tombstones exceed `compaction_threshold` of the live nodes, `compact`
+        runs (on a background thread when `background_compaction` is set).
+        """
+        with self._write_lock:
+            ids = np.unique(self._check_ids(ids))
+            self.deleted[ids] = True
+            self.n_deleted += len(ids)
+            self.n_tombstones += len(ids)
+            if self.n_tombstones > self.compaction_threshold * max(len(self), 1):
+                if not self.background_compaction:
+                    self.compact()
+                elif self._compaction is None or not self._compaction.is_alive():
+                    self._compaction = threading.Thread(target=self.compact, daemon=True)
+                    self._compaction.start()
+
+    def wait_for_compaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+
+    def compact(self):
+        """Unlink tombstoned nodes, repairing the neighbour lists that pointed at them.
+
+        Every live node that linked to a tombstone re-selects its neighbours
+        from its live neighbours plus the tombstone's live neighbours (the
+        two-hop detour a search would have taken through it). Tombstones then
+        leave the graph for good; their ids are not reused.
+
+        Searches may run meanwhile, so the steps are ordered to keep the graph
+        navigable throughout: live nodes are relinked on every layer first,
+        then the entry point moves off a tombstone, and only then are the
+        tombstones' own links cleared.
+        """
+        with self._write_lock:
+            self._check_writable()
+            dead = np.flatnonzero(self.deleted[:self.count] & (self.levels[:self.count] >= 0))
+            if not len(dead):
+                return
+            for layer in range(self.max_level + 1):
+                adj = self.neighbours[layer][:self.count]
+                on_layer = self.levels[:self.count] >= layer
+                dead_on_layer = dead[self.levels[dead] >= layer]
+                if not len(dead_on_layer):
+                    continue
+                points_at_dead = np.isin(adj, dead_on_layer).any(axis=1) & on_layer & ~self.deleted[:self.count]
+                for node in np.flatnonzero(points_at_dead).tolist():
+                    nbrs = self.neighbours_of(node, layer)
+                    detour = [self.neighbours_of(d, layer) for d in nbrs[self.deleted[nbrs]].tolist()]
+                    self._relink(node, layer, np.concatenate(detour).tolist() if detour else ())
+
+            if self.deleted[self.entry_point]:
+                live = np.flatnonzero((self.levels[:self.count] >= 0) & ~self.deleted[:self.count])
+                if len(live):
+                    self.entry_point = int(live[self.levels[live].argmax()])
+                    self.max_level = int(self.levels[self.entry_point])
+                else:
+                    self.entry_point, self.max_level = -1, -1
+
+            for layer in range(len(self.neighbours)):
+                for d in dead[self.levels[dead] >= layer].tolist():
+                    self._set_neighbours(d, layer, [])
+            self.levels[dead] = -1
+            self.n_tombstones = 0
+
+    # -- persistence -----------------------------------------------------
+
+    def _sections(self):
+        sections = [self.vectors[:self.count], self.levels[:self.count], self.deleted[:self.count]]
+        sections += [adj[:self.count] for adj in self.neighbours]
+        return sections
+
+    def save(self, path):
+        """Write the index to `path` in the format `load` memory-maps.
+
+        The file is written next to `path` and swapped in with `os.replace`, so
+        an index loaded from `path` keeps its mapping of the old file and a
+        failed save never leaves a partial index behind.
+        """
+        header = _HEADER.pack(MAGIC, VERSION, self.metric.encode(), self.dim, self.M,
+                              self.ef_construction, self.ef_search, self.count,
+                              self.entry_point, self.max_level, len(self.neighbours))
+        tmp = f"{os.fspath(path)}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+                for section in self._sections():
+                    f.write(b"\0" * (-f.tell() % _ALIGN))
+                    f.write(np.ascontiguousarray(section).tobytes())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Open an index written by `save` without reading it into memory.
+
+        Every array is an `np.memmap` over the file, so loading costs only the
+        header read and pages are faulted in as searches touch them. The
+        default read-only mode is enough for searching; use `mmap_mode="c"`
+        (copy on write) or `"r+"` to mutate the loaded index in place.
+        """
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+        if len(raw) < HEADER_SIZE or raw[:4] != MAGIC:
+            raise ValueError(f"{path}: not an HNSW index file")
+        (_, version, metric, dim, M, ef_construction, ef_search, count,
+         entry_point, max_level, n_layers) = _HEADER.unpack_from(raw)
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported HNSW index version {version}")
+
+        index = cls(dim, M=M, ef_construction=ef_construction, ef_search=ef_search,
+                    metric=metric.rstrip(b"\0").decode(), capacity=0)
+        shapes = [((count, dim), np.float32), ((count,), np.int32), ((count,), bool)]
+        shapes += [((count, index._width(layer)), np.int32) for layer in range(n_layers)]
+
+        offset = HEADER_SIZE
+        sections = []
+        for shape, dtype in shapes:
+            offset += -offset % _ALIGN
+            if count:
+                sections.append(np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape))
+            else:
+                sections.append(np.empty(shape, dtype=dtype))
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        index.vectors, index.levels, index.deleted, *index.neighbours = sections
+        index.count, index.entry_point, index.max_level = count, entry_point, max_level
+        index.n_deleted = int(index.deleted.sum())
+        index.n_tombstones = int((index.deleted & (index.levels >= 0)).sum())
+        return index
+
+    # -- networkx adapter -------------------------------------------------
+
+    def _layer_nodes(self, layer):
+        return np.flatnonzero(self.levels[:self.count] >= layer)
+
+    def to_networkx(self):
+        """One `nx.Graph` per layer, nodes carrying their vector as the `pos` attribute."""
+        import networkx as nx
+
+        graphs = []
+        for layer in range(self.max_level + 1):
+            G = nx.Graph()
+            for node in self._layer_nodes(layer).tolist():
+                G.add_node(node, pos=self.vectors[node].tolist())
+            for node in self._layer_nodes(layer).tolist():
+                G.add_edges_from((node, n) for n in self.neighbours_of(node, layer).tolist())
+            graphs.append(G)
+        return graphs
+
+    def search_graphs(self, query):
+        """Greedy search path per layer, as `(path_graphs, entry_graphs)` for plotting.
+
+        `path_graphs[layer]` holds the nodes visited on that layer joined in
+        visiting order, and `entry_graphs[layer]` the node the search entered
+        the layer at.
+        """
+        import networkx as nx
+
+        if self.entry_point < 0:
+            return [], []
+        q = self.prepare(query)[0]
+        node = self.entry_point
+        path_graphs = [None] * (self.max_level + 1)
+        entry_graphs = [None] * (self.max_level + 1)
+        for layer in range(self.max_level, -1, -1):
+            entry = nx.Graph()
+            entry.add_node(node, pos=self.vectors[node].tolist())
+            entry_graphs[layer] = entry
+
+            path = [node]
+            best = self._distances(q, [node])[0]
+            while True:
+                nbrs = self.neighbours_of(node, layer)
+                if not len(nbrs):
+                    break
+                d = self._distances(q, nbrs)
+                if d.min() >= best:
+                    break
+                node, best = int(nbrs[d.argmin()]), d.min()
+                path.append(node)
+
+            G = nx.Graph()
+            for n in path:
+                G.add_node(n, pos=self.vectors[n].tolist())
+            G.add_edges_from(zip(path[:-1], path[1:]))
+            path_graphs[layer] = G
+        return path_graphs, entry_graphs
+
+
+def _graph_candidates_worker(nodes):
+    return [_worker_index._graph_candidates(node) for node in nodes]
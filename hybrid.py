@@ -0,0 +1,200 @@
+"""In-process hybrid search: dense vector retrieval fused with BM25.
+
+`HybridSearch.retrieve` runs the keyword search (`bm25.BM25Index`) and the
+vector search (exact over a matrix of embeddings, or an `hnsw.HNSW` /
+`ivf.IVF` index) concurrently and returns their hits as `Candidates`: one
+array of document ids with, per retriever, the hit mask, the min-max
+normalized score and the reciprocal rank. Fusing is then a weighted sum of
+two arrays, so any number of `alpha` values can be tried on the same
+retrieval:
+
+    hybrid = HybridSearch(bm25_index, embeddings, encode_fn=embed)
+    candidates = hybrid.retrieve("animal")
+    for alpha in [0, 0.5, 1]:
+        ids, scores = candidates.fuse(alpha, k=3)
+
+As in Weaviate, `alpha=1` is a pure vector search and `alpha=0` pure BM25.
+"relative_score" fusion scales each retriever's scores to [0, 1] before
+weighting them; "ranked" fusion is weighted reciprocal rank fusion (RRF).
+
+`Candidates.fuse_grid` ranks a whole grid of alphas in one pass, and
+`evaluate_alphas` uses it to tune alpha over a query set with a single
+retrieval per query.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import knn
+from distances import is_similarity
+
+FUSIONS = ("relative_score", "ranked")
+
+# RRF's rank offset: a hit at rank r contributes 1 / (RRF_K + r)
+RRF_K = 60
+
+# hits taken from each retriever before fusing
+DEFAULT_LIMIT = 100
+
+
+def _normalize_scores(scores):
+    """Min-max scale `scores` to [0, 1]; all equal scores map to 1."""
+    if not len(scores):
+        return scores
+    lo, hi = scores.min(), scores.max()
+    if hi == lo:
+        return np.ones_like(scores)
+    return (scores - lo) / (hi - lo)
+
+
+class Candidates:
+    """Dense and sparse hits of one query, aligned on the union of their ids.
+
+    `dense_ids` / `sparse_ids` are ordered best first and their scores are
+    similarities (larger is better).
+    """
+
+    def __init__(self, dense_ids, dense_scores, sparse_ids, sparse_scores):
+        dense_ids, sparse_ids = np.asarray(dense_ids, dtype=np.int64), np.asarray(sparse_ids, dtype=np.int64)
+        self.ids = np.union1d(dense_ids, sparse_ids)
+        n = len(self.ids)
+        self.in_dense, self.in_sparse = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+        self.dense, self.sparse = np.zeros(n, dtype=np.float32), np.zeros(n, dtype=np.float32)
+        self.dense_rrf, self.sparse_rrf = np.zeros(n, dtype=np.float32), np.zeros(n, dtype=np.float32)
+
+        for ids, scores, hit, normalized, rrf in [
+            (dense_ids, dense_scores, self.in_dense, self.dense, self.dense_rrf),
+            (sparse_ids, sparse_scores, self.in_sparse, self.sparse, self.sparse_rrf),
+        ]:
+            pos = np.searchsorted(self.ids, ids)
+            hit[pos] = True
+            normalized[pos] = _normalize_scores(np.asarray(scores, dtype=np.float32))
+            rrf[pos] = 1 / (RRF_K + np.arange(1, len(ids) + 1))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def components(self, fusion="relative_score"):
+        """The per-retriever `(dense, sparse)` score arrays that `fusion` weights."""
+        if fusion == "relative_score":
+            return self.dense, self.sparse
+        if fusion == "ranked":
+            return self.dense_rrf, self.sparse_rrf
+        raise ValueError(f"unknown fusion {fusion!r}, expected one of {FUSIONS}")
+
+    def fuse(self, alpha=0.5, k=10, fusion="relative_score"):
+        """Top `k` ids for `alpha * dense + (1 - alpha) * sparse`: `(ids, scores)`, best first.
+
+        A retriever with zero weight contributes no hits, so `alpha=1` only
+        returns vector hits and `alpha=0` only keyword hits.
+        """
+        ids, scores = self.fuse_grid([alpha], k, fusion)
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+    def fuse_grid(self, alphas, k=10, fusion="relative_score"):
+        """`fuse` for every alpha in `alphas` at once: (A, k) ids and scores, padded with -1 / -inf."""
+        alphas = np.asarray(alphas, dtype=np.float32)
+        if alphas.ndim != 1 or ((alphas < 0) | (alphas > 1)).any():
+            raise ValueError(f"alphas must be a sequence of values between 0 and 1, got {alphas}")
+        dense, sparse = self.components(fusion)
+        scores = np.outer(alphas, dense) + np.outer(1 - alphas, sparse)
+        present = np.outer(alphas > 0, self.in_dense) | np.outer(alphas < 1, self.in_sparse)
+
+        ids = np.full((len(alphas), k), -1, dtype=np.int64)
+        best = np.full((len(alphas), k), -np.inf, dtype=np.float32)
+        pos, found = knn.topk(np.where(present, scores, -np.inf), k)
+        hit = np.isfinite(found)
+        ids[:, :pos.shape[1]] = np.where(hit, self.ids[pos] if len(self.ids) else -1, -1)
+        best[:, :pos.shape[1]] = found
+        return ids, best
+
+
+def evaluate_alphas(candidates, relevant, alphas=np.linspace(0, 1, 11), k=10, fusion="relative_score"):
+    """Mean recall@k, MRR and nDCG@k of every alpha over a query set.
+
+    `candidates` holds one retrieval (`Candidates`) per query and `relevant`
+    the ids of the relevant documents for each query. Each query's rankings
+    for the whole alpha grid come from a single `fuse_grid` call, so the
+    sweep never retrieves again. Queries without relevant documents are
+    skipped and left out of the means. Returns a dict of (A,) arrays, all
+    zero when no query could be evaluated.
+    """
+    alphas = np.asarray(alphas, dtype=np.float32)
+    recall, mrr, ndcg = (np.zeros(len(alphas)) for _ in range(3))
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    evaluated = 0
+    for query_candidates, query_relevant in zip(candidates, relevant):
+        query_relevant = np.asarray(list(query_relevant), dtype=np.int64)
+        if not len(query_relevant):
+            continue
+        evaluated += 1
+        ids, _ = query_candidates.fuse_grid(alphas, k, fusion)
+        hits = np.isin(ids, query_relevant) & (ids >= 0)
+        recall += hits.sum(axis=1) / min(len(query_relevant), k)
+        found = hits.any(axis=1)
+        mrr += np.divide(1, hits.argmax(axis=1) + 1, out=np.zeros(len(alphas)), where=found)
+        ndcg += (hits * discounts).sum(axis=1) / discounts[:min(len(query_relevant), k)].sum()
+    n = max(evaluated, 1)
+    return {"alpha": alphas, f"recall@{k}": recall / n, "mrr": mrr / n, f"ndcg@{k}": ndcg / n}
+
+
+class HybridSearch:
+    def __init__(self, sparse, dense, metric="cosine", encode_fn=None):
+        """`sparse` is a `BM25Index`; `dense` is an (N, dim) matrix of document embeddings
+        (searched exactly with `metric`) or an index with a `search(query, k)` method
+        such as `HNSW` or `IVF`. `encode_fn` maps a query string to its vector when
+        `retrieve` is not given one.
+        """
+        self.sparse = sparse
+        self.dense = dense
+        self.metric = getattr(dense, "metric", metric)
+        self.encode_fn = encode_fn
+        self._executor = ThreadPoolExecutor(2)
+
+    def _dense_search(self, query, query_vector, limit):
+        if query_vector is None:
+            if self.encode_fn is None:
+                raise ValueError("pass query_vector or give HybridSearch an encode_fn")
+            query_vector = self.encode_fn(query)
+        if hasattr(self.dense, "search"):
+            ids, scores = self.dense.search(query_vector, limit)
+        else:
+            ids, scores = knn.search(query_vector, self.dense, limit, self.metric)
+            ids, scores = ids[0], scores[0]
+        valid = ids >= 0
+        ids, scores = ids[valid], scores[valid]
+        return ids, (scores if is_similarity(self.metric) else -scores)
+
+    def retrieve(self, query, query_vector=None, limit=DEFAULT_LIMIT):
+        """Run both retrievers for `query` concurrently, keeping `limit` hits from each."""
+        dense = self._executor.submit(self._dense_search, query, query_vector, limit)
+        sparse_ids, sparse_scores = self.sparse.search(query, limit) if query.strip() else ([], [])
+        dense_ids, dense_scores = dense.result()
+        return Candidates(dense_ids, dense_scores, sparse_ids, sparse_scores)
+
+    def retrieve_many(self, queries, query_vectors=None, limit=DEFAULT_LIMIT):
+        """`retrieve` for every query; the candidates can then be fused for any number of alphas."""
+        query_vectors = [None] * len(queries) if query_vectors is None else query_vectors
+        return [self.retrieve(q, v, limit) for q, v in zip(queries, query_vectors)]
+
+    def evaluate(self, queries, relevant, alphas=np.linspace(0, 1, 11), k=10, fusion="relative_score",
+                 query_vectors=None, limit=DEFAULT_LIMIT):
+        """Retrieve every query once and score the whole alpha grid with `evaluate_alphas`."""
+        candidates = self.retrieve_many(queries, query_vectors, max(k, limit))
+        return evaluate_alphas(candidates, relevant, alphas, k, fusion)
+
+    def search(self, query, k=10, alpha=0.5, fusion="relative_score", query_vector=None, limit=None):
+        """Hybrid top `k` for `query`: `(ids, scores)`, best first."""
+        candidates = self.retrieve(query, query_vector, max(k, limit or DEFAULT_LIMIT))
+        return candidates.fuse(alpha, k, fusion)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,131 @@
+"""IVF (inverted file) index: k-means coarse partitioning for approximate search.
+
+The corpus is clustered into `n_lists` k-means centroids and every vector is
+stored in the posting list of its nearest centroid. Posting lists are kept
+as one contiguous array sorted by list, with `offsets` marking where each
+list starts, so scanning a list is a single slice and one matrix-vector
+product. A query scans only the `nprobe` lists whose centroids are nearest.
+
+Exposes the same `search` / `search_batch` interface as `hnsw.HNSW`.
+"""
+
+import math
+
+import numpy as np
+
+import knn
+from distances import as_matrix, distance_matrix, normalize, row_norms
+from quantization import assign_nearest, kmeans
+
+METRICS = ("l2", "cosine")
+
+
+class IVF:
+    def __init__(self, dim, n_lists=256, nprobe=8, metric="l2"):
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric!r}, expected one of {METRICS}")
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.metric = metric
+        self.centroids = None
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.list_ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        centroids = self.centroids.nbytes if self.centroids is not None else 0
+        return self.vectors.nbytes + self.ids.nbytes + self.list_ids.nbytes + centroids
+
+    def prepare(self, vectors):
+        """`vectors` as the float32 rows this index stores (L2 normalized for cosine)."""
+        if self.metric == "cosine":
+            return normalize(vectors)
+        return as_matrix(vectors)
+
+    def train(self, vectors, n_iter=20, max_samples=262_144, seed=None):
+        """Learn the coarse centroids from (a sample of) `vectors`."""
+        vectors = self.prepare(vectors)
+        rng = np.random.default_rng(seed)
+        if len(vectors) > max_samples:
+            vectors = vectors[rng.choice(len(vectors), max_samples, replace=False)]
+        self.centroids = kmeans(vectors, self.n_lists, n_iter, seed)
+        return self
+
+    def add(self, vectors):
+        """Assign `vectors` to their nearest lists; returns their ids."""
+        if self.centroids is None:
+            raise ValueError("train the index before adding vectors")
+        vectors = self.prepare(vectors)
+        new_ids = np.arange(self.count, self.count + len(vectors))
+        lists = assign_nearest(vectors, self.centroids)[0]
+
+        # merge into the contiguous, list-sorted layout
+        all_lists = np.concatenate([self.list_ids, lists])
+        order = np.argsort(all_lists, kind="stable")
+        self.vectors = np.concatenate([self.vectors, vectors])[order]
+        self.ids = np.concatenate([self.ids, new_ids])[order]
+        self.list_ids = all_lists[order]
+        self.offsets = np.searchsorted(self.list_ids, np.arange(self.n_lists + 1))
+        self.count += len(vectors)
+        return new_ids
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, nprobe=8, metric="l2", n_iter=20, seed=None):
+        """Train and fill an index; `n_lists` defaults to 4 * sqrt(N)."""
+        vectors = as_matrix(vectors)
+        n_lists = n_lists or max(1, min(len(vectors), int(4 * math.sqrt(len(vectors)))))
+        index = cls(vectors.shape[1], n_lists, nprobe, metric)
+        index.train(vectors, n_iter, seed=seed)
+        index.add(vectors)
+        return index
+
+    def _probe(self, queries, nprobe):
+        """(Q, nprobe) ids of the nearest lists for every query."""
+        if self.centroids is None:
+            raise ValueError("train the index before searching")
+        d = distance_matrix(queries, self.centroids, "l2")
+        return knn.topk(d, min(nprobe, self.n_lists), largest=False)[0]
+
+    def search(self, query, k, nprobe=None):
+        """Approximate `k` nearest neighbours of one query: `(ids, distances)`, closest first."""
+        q = self.prepare(query)
+        lists = self._probe(q, nprobe or self.nprobe)[0]
+        q = q[0]
+        ids, dists = [], []
+        for l in lists.tolist():
+            start, stop = self.offsets[l], self.offsets[l + 1]
+            if start == stop:
+                continue
+            # each list is a contiguous slice: scored in place, without gathering rows
+            block = self.vectors[start:stop]
+            if self.metric == "l2":
+                d = row_norms(block, squared=True) - 2 * (block @ q) + q @ q
+                d = np.sqrt(np.maximum(d, 0))
+            else:
+                d = 1 - block @ q
+            ids.append(self.ids[start:stop])
+            dists.append(d)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        ids, dists = np.concatenate(ids), np.concatenate(dists)
+        pos, best = knn.topk(dists, k, largest=False)
+        return ids[pos], best
+
+    def search_batch(self, queries, k, nprobe=None):
+        """`search` for every row of `queries`; (Q, k) arrays padded with -1 / inf."""
+        queries = as_matrix(queries)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        dists = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, q in enumerate(queries):
+            found_ids, found_dists = self.search(q, k, nprobe)
+            ids[i, :len(found_ids)] = found_ids
+            dists[i, :len(found_dists)] = found_dists
+        return ids, dists
@@ -0,0 +1,119 @@
+"""Exact (brute force) k nearest neighbour search.
+
+Helpers behind the hand-written kNN in the kNN lesson.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from distances import Corpus, DEFAULT_BLOCK_SIZE, as_matrix, is_similarity, iter_distance_blocks
+
+# queries scored together per tile; with the corpus block this bounds the
+# (queries x block) score matrix held in memory at any time
+DEFAULT_QUERY_BATCH = 1024
+
+
+def topk(scores, k, largest=True):
+    """Indices and values of the `k` best entries of `scores`, best first.
+
+    Uses `np.argpartition` to select the winners in linear time and only sorts
+    those `k`, instead of sorting the whole array. `scores` may be 1D, or 2D in
+    which case every row is handled independently and (rows, k) arrays are
+    returned. Set `largest=False` for distances, where smaller is better.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        empty = np.empty(scores.shape[:-1] + (0,))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+
+    keyed = -scores if largest else scores
+    if k < n:
+        part = np.argpartition(keyed, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    part_keys = np.take_along_axis(keyed, part, axis=-1)
+    # stable sort so ties keep the lowest index first, like a full argsort
+    order = np.lexsort((part, part_keys), axis=-1)
+    ids = np.take_along_axis(part, order, axis=-1)
+    return ids, np.take_along_axis(scores, ids, axis=-1)
+
+
+def merge_topk(ids, scores, k, largest=True):
+    """Merge candidate lists into one top-k.
+
+    `ids` and `scores` are sequences of (Q, k_i) arrays (e.g. one per corpus
+    block or shard) whose columns are concatenated before selecting the best `k`.
+    """
+    ids = np.concatenate(ids, axis=-1)
+    scores = np.concatenate(scores, axis=-1)
+    pos, best = topk(scores, k, largest)
+    return np.take_along_axis(ids, pos, axis=-1), best
+
+
+def search(queries, corpus, k, metric="dot", query_batch_size=DEFAULT_QUERY_BATCH,
+           block_size=DEFAULT_BLOCK_SIZE, dtype=np.float32):
+    """Exact kNN for a (Q, d) batch of queries.
+
+    Queries are tiled into `query_batch_size` rows and the corpus into
+    `block_size` rows; every tile pair is scored with one matrix multiply and
+    reduced to its top-k straight away, so memory stays bounded by the tile
+    size rather than Q x N. Returns (Q, k) arrays of corpus ids and scores
+    (similarities for "dot", distances otherwise), best first.
+    """
+    if not isinstance(corpus, Corpus):
+        corpus = Corpus(corpus, dtype)
+    queries = as_matrix(queries, corpus.vectors.dtype)
+    largest = is_similarity(metric)
+    k = min(k, len(corpus))
+
+    all_ids = np.empty((len(queries), k), dtype=np.int64)
+    all_scores = np.empty((len(queries), k), dtype=corpus.vectors.dtype)
+    for q0 in range(0, len(queries), query_batch_size):
+        tile = queries[q0:q0 + query_batch_size]
+        best_ids = np.empty((len(tile), 0), dtype=np.int64)
+        best_scores = np.empty((len(tile), 0), dtype=corpus.vectors.dtype)
+        for start, scores in iter_distance_blocks(tile, corpus, metric, block_size):
+            ids, block_best = topk(scores, k, largest)
+            best_ids, best_scores = merge_topk(
+                (best_ids, ids + start), (best_scores, block_best), k, largest)
+        all_ids[q0:q0 + len(tile)] = best_ids
+        all_scores[q0:q0 + len(tile)] = best_scores
+    return all_ids, all_scores
+
+
+def _search_shard(queries, shard, offset, k, metric, query_batch_size, block_size):
+    ids, scores = search(queries, shard, k, metric, query_batch_size, block_size)
+    return ids + offset, scores
+
+
+def sharded_search(queries, corpus, k, metric="dot", n_shards=None, use_processes=False,
+                   query_batch_size=DEFAULT_QUERY_BATCH, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float32):
+    """Exact kNN with the corpus split into `n_shards` searched in parallel.
+
+    Each contiguous shard is searched with `search` on a worker pool and the
+    per-shard top-k lists are merged, which gives the same ids and scores as
+    searching the corpus in one piece. Threads are used by default since the
+    matrix multiplies release the GIL; pass `use_processes=True` when the
+    per-shard work is Python-bound (shards are then pickled to the workers).
+    When sharding across cores, limit BLAS to one thread per worker (e.g.
+    OMP_NUM_THREADS=1) so the two levels of parallelism don't oversubscribe.
+    """
+    corpus = as_matrix(corpus, dtype)
+    queries = as_matrix(queries, dtype)
+    n_shards = max(1, min(n_shards or os.cpu_count() or 1, len(corpus)))
+    bounds = np.linspace(0, len(corpus), n_shards + 1).astype(int)
+
+    pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool(max_workers=n_shards) as executor:
+        futures = [
+            executor.submit(_search_shard, queries, corpus[lo:hi], lo, k, metric, query_batch_size, block_size)
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+        results = [f.result() for f in futures]
+
+    return merge_topk([ids for ids, _ in results], [scores for _, scores in results],
+                      k, is_similarity(metric))
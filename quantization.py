@@ -0,0 +1,371 @@
+"""Compressed vector storage.
+
+Product quantization (PQ): each vector is split into `m` sub-vectors and every
+sub-vector is replaced by the id of its nearest centroid in a small codebook
+trained with k-means, so a 768-dim float64 vector (6KB) becomes e.g. 96 one
+byte codes. Queries are scored against the codes with asymmetric distance
+computation (ADC): a per-query (m, 256) lookup table of sub-vector distances
+to every centroid, summed over the code bytes. The top candidates can then
+be re-ranked exactly against the original vectors.
+
+Scalar quantization: every dimension is stored as int8 (scaled between its
+per-dimension min and max) or as float16, for 8x / 4x less memory than
+float64, and scored with dot / cosine kernels that work on the quantized
+rows directly.
+
+Binary quantization: one sign bit per dimension packed into uint64 words
+(32x smaller than float32), scanned with XOR + popcount Hamming distance as
+a cheap first stage before exact cosine re-ranking on the float vectors.
+"""
+
+import numpy as np
+
+import knn
+from distances import DEFAULT_BLOCK_SIZE, as_matrix, distance_matrix, row_norms
+
+# rows scored per ADC block; bounds the (queries x rows) score matrix
+ADC_BLOCK_SIZE = 65_536
+
+
+def kmeans(x, k, n_iter=20, seed=None):
+    """Lloyd's k-means on the rows of `x`; returns (k, d) float32 centroids.
+
+    Starts from `k` distinct random rows and re-seeds any cluster that goes
+    empty with the point currently farthest from its centroid.
+    """
+    x = as_matrix(x)
+    rng = np.random.default_rng(seed)
+    if len(x) < k:
+        raise ValueError(f"need at least {k} training vectors, got {len(x)}")
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(n_iter):
+        assign, dist = assign_nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            far = np.argsort(-dist)[:empty.sum()]
+            centroids[empty] = x[far]
+    return centroids
+
+
+def assign_nearest(x, centroids, block_size=DEFAULT_BLOCK_SIZE):
+    """Index of, and squared L2 distance to, the nearest centroid for every row of `x`."""
+    x = as_matrix(x)
+    c_sq = row_norms(centroids, squared=True)
+    assign = np.empty(len(x), dtype=np.int64)
+    dist = np.empty(len(x), dtype=np.float32)
+    for start in range(0, len(x), block_size):
+        block = x[start:start + block_size]
+        d = row_norms(block, squared=True)[:, None] + c_sq[None, :] - 2 * (block @ centroids.T)
+        assign[start:start + len(block)] = d.argmin(1)
+        dist[start:start + len(block)] = np.maximum(d.min(1), 0)
+    return assign, dist
+
+
+class ProductQuantizer:
+    """Splits `dim` into `m` sub-spaces, each quantized to `2**n_bits` centroids."""
+
+    def __init__(self, dim, m=96, n_bits=8):
+        if dim % m:
+            raise ValueError(f"dim {dim} is not divisible by m={m}")
+        if not 1 <= n_bits <= 8:
+            raise ValueError("n_bits must be between 1 and 8 (one byte per code)")
+        self.dim = dim
+        self.m = m
+        self.dsub = dim // m
+        self.ksub = 2 ** n_bits
+        self.codebooks = None  # (m, ksub, dsub)
+
+    @property
+    def code_size(self):
+        """Bytes per encoded vector."""
+        return self.m
+
+    def _split(self, x):
+        return as_matrix(x).reshape(-1, self.m, self.dsub)
+
+    def train(self, x, n_iter=20, max_samples=65_536, seed=None):
+        """Learn one k-means codebook per sub-space from (a sample of) `x`."""
+        x = as_matrix(x)
+        rng = np.random.default_rng(seed)
+        if len(x) > max_samples:
+            x = x[rng.choice(len(x), max_samples, replace=False)]
+        sub = self._split(x)
+        self.codebooks = np.stack([
+            kmeans(sub[:, j], self.ksub, n_iter, seed=rng.integers(1 << 31)) for j in range(self.m)
+        ])
+        return self
+
+    def encode(self, x, block_size=ADC_BLOCK_SIZE):
+        """(n, m) uint8 codes: the nearest centroid per sub-vector."""
+        x = as_matrix(x)
+        codes = np.empty((len(x), self.m), dtype=np.uint8)
+        for start in range(0, len(x), block_size):
+            sub = self._split(x[start:start + block_size])
+            for j in range(self.m):
+                codes[start:start + len(sub), j] = assign_nearest(sub[:, j], self.codebooks[j])[0]
+        return codes
+
+    def decode(self, codes):
+        """Approximate vectors rebuilt from their codes."""
+        codes = np.asarray(codes)
+        return self.codebooks[np.arange(self.m), codes].reshape(len(codes), self.dim)
+
+    def distance_tables(self, queries, metric="l2"):
+        """(Q, m, ksub) ADC lookup tables.
+
+        For "l2" entry [q, j, c] is the squared distance between sub-vector j
+        of query q and centroid c; for "dot" it is their dot product.
+        """
+        sub = self._split(queries)  # (Q, m, dsub)
+        dots = np.einsum("qjd,jcd->qjc", sub, self.codebooks)
+        if metric == "dot":
+            return dots
+        if metric != "l2":
+            raise ValueError(f"ADC supports 'l2' and 'dot', not {metric!r}")
+        c_sq = np.einsum("jcd,jcd->jc", self.codebooks, self.codebooks)
+        q_sq = np.einsum("qjd,qjd->qj", sub, sub)
+        return q_sq[:, :, None] + c_sq[None] - 2 * dots
+
+    def adc(self, tables, codes):
+        """(Q, n) approximate scores of every query against every code row."""
+        scores = np.zeros((len(tables), len(codes)), dtype=np.float32)
+        for j in range(self.m):
+            scores += tables[:, j, codes[:, j]]
+        return scores
+
+
+class PQIndex:
+    """PQ codes for a corpus, optionally kept alongside the original vectors for re-ranking.
+
+    `vectors` can be any array-like indexable by ids, e.g. a `VectorStore`'s
+    memmap, so full-precision data only needs to be read for the re-ranked
+    candidates.
+    """
+
+    def __init__(self, pq, codes, vectors=None):
+        self.pq = pq
+        self.codes = codes
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, vectors, m=96, n_bits=8, keep_vectors=True, n_iter=20, seed=None):
+        vectors = as_matrix(vectors)
+        pq = ProductQuantizer(vectors.shape[1], m, n_bits).train(vectors, n_iter, seed=seed)
+        return cls(pq, pq.encode(vectors), vectors if keep_vectors else None)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.pq.codebooks.nbytes
+
+    def search(self, queries, k, metric="l2", rerank=None, block_size=ADC_BLOCK_SIZE):
+        """`(ids, scores)` of shape (Q, k): squared-L2 distances for "l2", similarities for "dot".
+
+        With `rerank` set (and original vectors available) the best `rerank`
+        ADC candidates are re-scored exactly and the top `k` of those returned;
+        exact "l2" scores are then true (not squared) distances.
+        """
+        queries = as_matrix(queries)
+        largest = metric == "dot"
+        n_candidates = max(k, rerank or 0) if self.vectors is not None else k
+        tables = self.pq.distance_tables(queries, metric)
+
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self.codes), block_size):
+            scores = self.pq.adc(tables, self.codes[start:start + block_size])
+            ids, top = knn.topk(scores, n_candidates, largest)
+            best_ids, best_scores = knn.merge_topk((best_ids, ids + start), (best_scores, top),
+                                                   n_candidates, largest)
+        if not rerank or self.vectors is None:
+            return best_ids[:, :k], best_scores[:, :k]
+
+        ids = np.empty((len(queries), min(k, best_ids.shape[1])), dtype=np.int64)
+        scores = np.empty(ids.shape, dtype=np.float32)
+        for i, (q, candidates) in enumerate(zip(queries, best_ids)):
+            exact = distance_matrix(q, np.asarray(self.vectors[np.sort(candidates)]), metric)[0]
+            pos, scores[i] = knn.topk(exact, k, largest)
+            ids[i] = np.sort(candidates)[pos]
+        return ids, scores
+
+
+class ScalarQuantizer:
+    """Per-dimension int8, or float16, storage of vectors.
+
+    int8 codes map each dimension's [min, max] range (learned by `train`)
+    onto [-128, 127], so x ~ offset + scale * code.
+    """
+
+    def __init__(self, dtype="int8"):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"dtype must be 'int8' or 'float16', not {dtype!r}")
+        self.dtype = dtype
+        self.scale = None
+        self.offset = None
+
+    def train(self, x):
+        if self.dtype == "int8":
+            x = as_matrix(x)
+            lo, hi = x.min(0), x.max(0)
+            self.scale = np.maximum(hi - lo, 1e-12) / 255
+            self.offset = lo + 128 * self.scale  # value of code 0
+        return self
+
+    def encode(self, x):
+        x = as_matrix(x)
+        if self.dtype == "float16":
+            return x.astype(np.float16)
+        codes = np.rint((x - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes):
+        if self.dtype == "float16":
+            return codes.astype(np.float32)
+        return self.offset + self.scale * codes.astype(np.float32)
+
+    def dot(self, queries, codes):
+        """(Q, n) dot products between float queries and quantized rows.
+
+        For int8, q . x = q . offset + (q * scale) . code, so the scale is
+        folded into the query once and each block of codes goes through a
+        single matrix multiply.
+        """
+        queries = as_matrix(queries)
+        if self.dtype == "float16":
+            return queries @ codes.astype(np.float32).T
+        scaled = queries * self.scale
+        return scaled @ codes.astype(np.float32).T + (queries @ self.offset)[:, None]
+
+
+class ScalarQuantizedIndex:
+    """A corpus stored as int8 or float16 codes, searched by dot product or cosine."""
+
+    def __init__(self, sq, codes):
+        self.sq = sq
+        self.codes = codes
+        # norms of the decoded rows, so cosine matches what the codes represent
+        self.norms = np.concatenate([
+            row_norms(sq.decode(codes[i:i + ADC_BLOCK_SIZE])) for i in range(0, len(codes), ADC_BLOCK_SIZE)
+        ]) if len(codes) else np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def build(cls, vectors, dtype="int8"):
+        sq = ScalarQuantizer(dtype).train(vectors)
+        return cls(sq, sq.encode(vectors))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.norms.nbytes
+
+    def search(self, queries, k, metric="dot", block_size=ADC_BLOCK_SIZE):
+        """`(ids, scores)` of shape (Q, k): dot-product similarities, or cosine distances."""
+        if metric not in ("dot", "cosine"):
+            raise ValueError(f"scalar quantized search supports 'dot' and 'cosine', not {metric!r}")
+        queries = as_matrix(queries)
+        largest = metric == "dot"
+        q_norms = row_norms(queries)
+        q_norms[q_norms == 0] = 1
+
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self.codes), block_size):
+            scores = self.sq.dot(queries, self.codes[start:start + block_size])
+            if metric == "cosine":
+                norms = self.norms[start:start + block_size]
+                scores = 1 - scores / (q_norms[:, None] * np.where(norms == 0, 1, norms)[None, :])
+            ids, top = knn.topk(scores, k, largest)
+            best_ids, best_scores = knn.merge_topk((best_ids, ids + start), (best_scores, top), k, largest)
+        return best_ids, best_scores
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(x):
+    """Number of set bits in each element of the uint64 array `x`."""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(-1, dtype=np.uint8)
+
+
+def binarize(x):
+    """Pack the sign bits of every row of `x` into (n, ceil(d / 64)) uint64 words."""
+    bits = np.packbits(as_matrix(x) > 0, axis=1, bitorder="little")
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+def hamming_distances(query_code, codes):
+    """Hamming distance from one packed query code to every packed row of `codes`."""
+    return popcount(codes ^ query_code).sum(1, dtype=np.int32)
+
+
+class BinaryIndex:
+    """Sign-bit codes for a first-stage Hamming scan, re-ranked by exact cosine distance.
+
+    `vectors` (any array-like indexable by ids, e.g. a memmap) are only read
+    for the re-ranked candidates.
+    """
+
+    def __init__(self, codes, vectors=None):
+        self.codes = codes
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, vectors, keep_vectors=True):
+        vectors = as_matrix(vectors)
+        return cls(binarize(vectors), vectors if keep_vectors else None)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def search(self, queries, k, rerank=100, block_size=ADC_BLOCK_SIZE):
+        """`(ids, scores)` of shape (Q, k).
+
+        The `rerank` ids with the smallest Hamming distance are re-scored by
+        exact cosine distance against the float vectors; without stored
+        vectors (or with `rerank=None`) the Hamming distances are returned.
+        """
+        queries = as_matrix(queries)
+        query_codes = binarize(queries)
+        exact = bool(rerank) and self.vectors is not None
+        n_candidates = max(k, rerank) if exact else k
+
+        found = []
+        for q_code in query_codes:
+            best_ids = np.empty(0, dtype=np.int64)
+            best_dists = np.empty(0, dtype=np.int32)
+            for start in range(0, len(self.codes), block_size):
+                dists = hamming_distances(q_code, self.codes[start:start + block_size])
+                ids, top = knn.topk(dists, n_candidates, largest=False)
+                best_ids, best_dists = knn.merge_topk((best_ids, ids + start), (best_dists, top),
+                                                      n_candidates, largest=False)
+            found.append((best_ids, best_dists))
+
+        k = min(k, len(self.codes))
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32 if exact else np.int32)
+        for i, (q, (candidates, dists)) in enumerate(zip(queries, found)):
+            if not exact:
+                ids[i], scores[i] = candidates[:k], dists[:k]
+                continue
+            candidates = np.sort(candidates)
+            cosine = distance_matrix(q, np.asarray(self.vectors[candidates]), "cosine")[0]
+            pos, scores[i] = knn.topk(cosine, k, largest=False)
+            ids[i] = candidates[pos]
+        return ids, scores
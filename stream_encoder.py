@@ -0,0 +1,86 @@
+"""Streaming, length-bucketed batch encoding for large text corpora.
+
+`model.encode(sentences)` needs the whole corpus in memory and pads every
+batch to its longest text. `stream_encode` instead reads texts from any
+iterable a window at a time, sorts each window by length so batches hold
+texts of similar length (less padding), encodes the batches on a thread pool
+and yields `(ids, embeddings)` chunks as they finish, in input-window order.
+At most `max_pending` batches are in flight, so memory stays bounded however
+long the input is.
+
+    for ids, embeddings in stream_encode(read_texts(), model.encode, batch_size=64):
+        store.append(embeddings)
+"""
+
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from vector_store import VectorStore
+
+
+def _with_ids(texts):
+    """Accept plain texts (numbered from 0) or `(id, text)` pairs."""
+    for i, item in enumerate(texts):
+        if isinstance(item, str):
+            yield i, item
+        else:
+            yield item
+
+
+def _batches(texts, batch_size, window, length_fn):
+    items = _with_ids(texts)
+    while True:
+        chunk = list(itertools.islice(items, window))
+        if not chunk:
+            return
+        chunk.sort(key=lambda item: length_fn(item[1]))
+        for start in range(0, len(chunk), batch_size):
+            yield chunk[start:start + batch_size]
+
+
+def stream_encode(texts, encode_fn, batch_size=64, window_batches=32, n_workers=None, max_pending=None,
+                  length_fn=len):
+    """Yield `(ids, embeddings)` for every batch of `texts`.
+
+    `texts` is any iterable of strings or `(id, text)` pairs; `encode_fn`
+    maps a list of texts to an (n, dim) array, e.g. `model.encode`.
+    `window_batches` batches worth of texts are read and sorted by
+    `length_fn` (character length by default; pass a tokenizer-based length
+    for exact token counts) before being split into batches.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * n_workers
+
+    def encode(batch):
+        ids = np.array([i for i, _ in batch])
+        return ids, np.asarray(encode_fn([text for _, text in batch]))
+
+    pending = deque()
+    with ThreadPoolExecutor(n_workers) as executor:
+        for batch in _batches(texts, batch_size, batch_size * window_batches, length_fn):
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(encode, batch))
+        while pending:
+            yield pending.popleft().result()
+
+
+def encode_to_store(texts, encode_fn, path, dtype=np.float32, **kwargs):
+    """Stream-encode `texts` into a new `VectorStore` at `path`.
+
+    Rows are written in batch order, which is length-sorted within each
+    window rather than input order, so the id of every row is returned
+    alongside the store.
+    """
+    store = None
+    row_ids = []
+    for ids, embeddings in stream_encode(texts, encode_fn, **kwargs):
+        if store is None:
+            store = VectorStore.create(path, embeddings.shape[1], dtype)
+        store.append(embeddings)
+        row_ids.append(ids)
+    return store, (np.concatenate(row_ids) if row_ids else np.empty(0, dtype=np.int64))
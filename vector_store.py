@@ -0,0 +1,150 @@
+"""On-disk vector storage opened with `np.memmap`.
+
+File layout: a fixed 64 byte header followed by the vectors as one flat,
+row-major array.
+
+    offset  size  field
+    0       4     magic b"VECS"
+    4       4     format version (uint32)
+    8       8     numpy dtype string, e.g. b"<f4" (NUL padded)
+    16      8     dim (uint64)
+    24      8     count (uint64)
+    32      32    reserved
+
+Opening a store only reads the header and maps the data, so reopening a
+corpus is near-instant and corpora larger than RAM can be searched by
+streaming over the mapping in chunks.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+import knn
+from distances import DEFAULT_BLOCK_SIZE, is_similarity
+
+MAGIC = b"VECS"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sI8sQQ")
+
+# rows streamed from disk per search chunk; 1M x 768 float32 is ~3GB, so
+# callers with little RAM should lower this
+DEFAULT_CHUNK_SIZE = 262_144
+
+
+def _pack_header(dtype, dim, count):
+    header = _HEADER.pack(MAGIC, VERSION, np.dtype(dtype).str.encode(), dim, count)
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path):
+    """Return `(dtype, dim, count)` stored in the header of `path`."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path}: file too short to be a vector store")
+    magic, version, dtype, dim, count = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a vector store (bad magic {magic!r})")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported vector store version {version}")
+    return np.dtype(dtype.rstrip(b"\0").decode()), dim, count
+
+
+class VectorStore:
+    """A memory-mapped (count, dim) matrix backed by a single file."""
+
+    def __init__(self, path, mode="r"):
+        self.path = path
+        self.mode = mode
+        self.dtype, self.dim, self.count = read_header(path)
+        self._map()
+
+    def _map(self):
+        if self.count == 0:
+            self.vectors = np.empty((0, self.dim), dtype=self.dtype)
+        else:
+            self.vectors = np.memmap(self.path, dtype=self.dtype, mode=self.mode,
+                                     offset=HEADER_SIZE, shape=(self.count, self.dim))
+
+    @classmethod
+    def create(cls, path, dim, dtype=np.float32):
+        """Create an empty store at `path` (overwriting it) and open it for appending."""
+        with open(path, "wb") as f:
+            f.write(_pack_header(dtype, dim, 0))
+        return cls(path, mode="r+")
+
+    @classmethod
+    def from_array(cls, path, vectors, dtype=np.float32, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Write `vectors` (an array or any iterable of 2D chunks) to a new store at `path`."""
+        if isinstance(vectors, np.ndarray):
+            chunks = (vectors[i:i + chunk_size] for i in range(0, len(vectors), chunk_size))
+            dim = vectors.shape[1]
+        else:
+            chunks = iter(vectors)
+            first = np.asarray(next(chunks))
+            dim = first.shape[1]
+            chunks = _chain(first, chunks)
+        store = cls.create(path, dim, dtype)
+        for chunk in chunks:
+            store.append(chunk)
+        return store
+
+    def __len__(self):
+        return self.count
+
+    def append(self, vectors):
+        """Append a (n, dim) block of vectors to the end of the file."""
+        if self.mode == "r":
+            raise ValueError("vector store was opened read-only")
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"expected an (n, {self.dim}) array, got shape {vectors.shape}")
+
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + self.count * self.dim * self.dtype.itemsize)
+            f.write(vectors.tobytes())
+            self.count += len(vectors)
+            f.seek(0)
+            f.write(_pack_header(self.dtype, self.dim, self.count))
+        self._map()
+
+    def flush(self):
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield `(start, chunk)` over the stored rows, `chunk_size` rows at a time."""
+        for start in range(0, self.count, chunk_size):
+            yield start, self.vectors[start:start + chunk_size]
+
+    def search(self, queries, k, metric="dot", chunk_size=DEFAULT_CHUNK_SIZE, block_size=DEFAULT_BLOCK_SIZE):
+        """Exact kNN over the whole store, streamed from disk one chunk at a time.
+
+        Only one chunk (plus its row norms) is resident at once, so the store
+        can be much larger than RAM. Returns (Q, k) ids and scores like `knn.search`.
+        """
+        largest = is_similarity(metric)
+        best_ids = np.empty((len(np.atleast_2d(queries)), 0), dtype=np.int64)
+        best_scores = np.empty(best_ids.shape, dtype=self.dtype)
+        for start, chunk in self.iter_chunks(chunk_size):
+            ids, scores = knn.search(queries, np.asarray(chunk), k, metric,
+                                     block_size=block_size, dtype=self.dtype)
+            best_ids, best_scores = knn.merge_topk((best_ids, ids + start), (best_scores, scores), k, largest)
+        return best_ids, best_scores
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def open_store(path, mode="r"):
+    """Open an existing store; `mode="r+"` allows appending and in-place writes."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return VectorStore(path, mode)